@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import JournalEntry, UploadedFile, ProcessingLog, Project
+from .search import search_filter
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
@@ -35,6 +36,13 @@ class JournalEntryAdmin(admin.ModelAdmin):
     search_fields = ['title', 'account_name', 'reference_number', 'project__name']
     date_hierarchy = 'date'
     raw_id_fields = ['project']
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the full-text index instead of LIKE '%term%' scans over
+        # search_fields; the project name is still matched with icontains.
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search_filter(search_term)), False
 
 @admin.register(UploadedFile)
 class UploadedFileAdmin(admin.ModelAdmin):
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class JournalAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'journal_app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import caching, ledger, signals  # noqa: F401 (connect receivers)
+        from .db import configure_connection
+
+        connection_created.connect(configure_connection, dispatch_uid='journal_app.configure_connection')
@@ -0,0 +1,150 @@
+"""Read-through cache for project summaries and first pages of entry listings.
+
+Cached values are keyed by version counters stored in the cache itself:
+``project:<id>`` (a project's summary and entries), ``projects`` (the project
+list) and ``entries`` (the unfiltered entry listings). Writes bump the
+counters instead of deleting keys, so stale values are never read again and
+age out through the backend's size bound (LRU for the local-memory cache).
+A counter that has been evicted is re-created from the clock, which also
+invalidates everything keyed by it.
+
+The backend is the JOURNAL_CACHE_ALIAS entry of CACHES. The local-memory
+backend is per process, so with several worker processes (or
+``run_import_workers``) use a shared backend such as Redis or the file cache,
+otherwise a process only sees its own writes and stale pages live until the
+cache TIMEOUT.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .metrics import REGISTRY
+from .models import JournalEntry, Project, UploadedFile
+from .signals import (
+    entries_updated, ledger_entries_added, ledger_entries_deleted, ledger_entries_removed, ledger_entries_updated,
+)
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'journal_cache_requests_total', 'Read-through cache lookups by cache and result (hit or miss).',
+    labels=('cache', 'result'),
+)
+
+# Never a cached value, so a miss can be told apart from a cached None.
+MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'JOURNAL_CACHE_ALIAS', 'default')]
+
+
+def version_key(name):
+    return f'journal:version:{name}'
+
+
+def project_version(project_id):
+    return f'project:{project_id}'
+
+
+def get_versions(names):
+    cache = get_cache()
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*names):
+    cache = get_cache()
+    for name in names:
+        try:
+            cache.incr(version_key(name))
+        except ValueError:  # evicted or never read; any new value invalidates
+            cache.set(version_key(name), time.time_ns(), timeout=None)
+
+
+def invalidate(*names):
+    """Bump ``names`` now and again once the current transaction commits.
+
+    The second bump discards pages cached by readers that ran between the
+    write and the commit and so still saw the old rows.
+    """
+    bump(*names)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump(*names))
+
+
+def invalidate_projects(project_ids):
+    invalidate('projects', 'entries', *(project_version(pk) for pk in project_ids))
+
+
+def cached_value(name, key, versions, compute):
+    """Return the cached value for ``key`` under ``versions``, computing it on a miss."""
+    cache = get_cache()
+    versioned = ':'.join(str(version) for version in get_versions(versions))
+    digest = hashlib.sha1(f'{key}|{versioned}'.encode()).hexdigest()
+    cache_key = f'journal:{name}:{digest}'
+    value = cache.get(cache_key, MISSING)
+    if value is not MISSING:
+        CACHE_REQUESTS.inc(cache=name, result='hit')
+        return value
+    CACHE_REQUESTS.inc(cache=name, result='miss')
+    value = compute()
+    cache.set(cache_key, value)
+    return value
+
+
+@receiver(ledger_entries_added)
+@receiver(ledger_entries_removed)
+def invalidate_entries(sender, entries, **kwargs):
+    invalidate_projects({entry.project_id for entry in entries if entry.project_id is not None})
+
+
+@receiver(ledger_entries_deleted)
+@receiver(ledger_entries_updated)
+@receiver(entries_updated)
+def invalidate_entry_queryset(sender, queryset, **kwargs):
+    invalidate_projects(queryset.exclude(project=None).values_list('project_id', flat=True).distinct().order_by())
+
+
+@receiver(post_save, sender=JournalEntry)
+def invalidate_saved_entry(sender, instance, **kwargs):
+    # Ledger saves are also covered by invalidate_entries; saves limited to
+    # other fields (update_fields=['title']) send no ledger signal.
+    if instance.project_id is not None:
+        invalidate_projects([instance.project_id])
+
+
+@receiver(pre_delete, sender=UploadedFile)
+def invalidate_source_file_entries(sender, instance, **kwargs):
+    # The upload's entries are kept, with source_file set to NULL by a plain
+    # UPDATE that sends no signal.
+    invalidate_entry_queryset(sender, JournalEntry.objects.filter(source_file=instance))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project(sender, instance, **kwargs):
+    invalidate_projects([instance.pk])
+
+
+@receiver(m2m_changed, sender=Project.team_members.through)
+def invalidate_team(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # user.projects.clear(): remember the projects before they are unlinked.
+        instance._journal_cleared_projects = list(instance.projects.values_list('pk', flat=True))
+        return
+    if not action.startswith('post_'):
+        return
+    if reverse:  # instance is the user
+        project_ids = pk_set if pk_set is not None else instance.__dict__.pop('_journal_cleared_projects', [])
+        invalidate_projects(project_ids)
+    else:
+        invalidate_projects([instance.pk])
@@ -0,0 +1,188 @@
+"""In-process publish/subscribe of upload progress, streamed as Server-Sent Events.
+
+FileProcessor publishes a ``file_status_payload`` whenever it commits a batch
+and when the job ends; ``file_events_view`` subscribes from the ASGI event
+loop. Publishers are worker threads, so events are handed to each subscriber's
+loop with ``call_soon_threadsafe``. Only jobs processed by this process are
+published (``publishing_file_status``); see ``stream_file_events`` for jobs
+run by ``run_import_workers``.
+"""
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import UploadedFile
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+def file_status_payload(uploaded_file, logs):
+    """The body of ``file_status_view`` (and of each event) for ``uploaded_file``."""
+    return {
+        'status': uploaded_file.status,
+        'processed_entries': uploaded_file.processed_entries_count,
+        'error_message': uploaded_file.error_message,
+        'logs': [
+            {'id': log.pk, 'message': log.message, 'level': log.level, 'timestamp': log.timestamp}
+            for log in logs
+        ],
+    }
+
+
+def last_log_id(event, default=None):
+    """The newest log id in ``event``, or ``default`` if it carries none."""
+    return max((log['id'] for log in event['logs']), default=default)
+
+
+class Subscription:
+    def __init__(self, broker, key):
+        self.broker = broker
+        self.key = key
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, event):
+        # Called from publisher threads.
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:  # the subscriber's loop has closed
+            self.close()
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        # Keys of jobs being processed (and so published) by this process.
+        self.publishers = Counter()
+        self.lock = threading.Lock()
+
+    def subscribe(self, key):
+        """Subscribe to ``key``; must be called from the event loop that will read the events."""
+        subscription = Subscription(self, key)
+        with self.lock:
+            self.subscribers[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.key)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.key]
+
+    def publish(self, key, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(key, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def has_subscribers(self, key):
+        return key in self.subscribers
+
+    def start_publishing(self, key):
+        with self.lock:
+            self.publishers[key] += 1
+
+    def stop_publishing(self, key):
+        with self.lock:
+            self.publishers[key] -= 1
+            if self.publishers[key] <= 0:
+                del self.publishers[key]
+
+    def is_published(self, key):
+        return key in self.publishers
+
+
+BROKER = Broker()
+
+
+def publish_file_status(uploaded_file, logs=()):
+    key = str(uploaded_file.pk)
+    if BROKER.has_subscribers(key):
+        BROKER.publish(key, file_status_payload(uploaded_file, logs))
+
+
+@contextmanager
+def publishing_file_status(uploaded_file):
+    """Mark ``uploaded_file`` as processed here, so its streams wait for events
+    instead of re-reading it from the database."""
+    key = str(uploaded_file.pk)
+    BROKER.start_publishing(key)
+    try:
+        yield
+    finally:
+        BROKER.stop_publishing(key)
+
+
+def format_event(data, event=None, event_id=None):
+    lines = [f'event: {event}'] if event else []
+    if event_id is not None:
+        # Sent back by EventSource as Last-Event-ID when it reconnects.
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def current_file_status(file_id, after=None):
+    """The status of ``file_id`` with its last 10 logs, or only logs newer than ``after``."""
+    uploaded_file = await UploadedFile.objects.aget(pk=file_id)
+    logs = uploaded_file.logs.all()
+    if after is not None:
+        logs = logs.filter(pk__gt=after)
+    return file_status_payload(uploaded_file, [log async for log in logs[:10]])
+
+
+async def stream_file_events(file_id, heartbeat, after=None):
+    """Yield SSE messages for one upload until it completes or fails.
+
+    The first message is the current status with the last 10 logs (those
+    newer than ``after``, the Last-Event-ID of a reconnecting client); later
+    ones carry the new logs only. Every event's id is the newest log id sent
+    so far. After ``heartbeat`` seconds without an event the status and logs
+    are re-read from the database, which is the only way to follow jobs run
+    by ``run_import_workers`` (another process cannot publish here), and a
+    keep-alive comment is sent if nothing changed. Jobs this process is
+    processing publish every change, so their streams skip the re-read.
+    """
+    key = str(file_id)
+    subscription = BROKER.subscribe(key)
+    try:
+        event = await current_file_status(file_id, after)
+        while True:
+            if event is not None:
+                after = last_log_id(event, after)
+                yield format_event(event, event_id=after)
+                if event['status'] in FINISHED_STATUSES:
+                    yield format_event({}, event='done')
+                    return
+                last = (event['status'], event['processed_entries'])
+            try:
+                event = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                event = None
+                if not BROKER.is_published(key):
+                    state = await current_file_status(file_id, after)
+                    if state['logs'] or (state['status'], state['processed_entries']) != last:
+                        event = state
+                if event is None:
+                    yield ': keep-alive\n\n'
+    finally:
+        subscription.close()
@@ -0,0 +1,151 @@
+"""Constant-memory export of journal entries as CSV, JSON Lines or XLSX.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` as plain tuples and
+written out incrementally, so neither model instances nor the full result set
+are ever held in memory.
+
+CSV and JSON Lines stream as rows are read. XLSX does not: the workbook can
+only be zipped once complete, so it is built in a temporary file and sent
+after the last row, which costs disk space and delays the first byte in
+proportion to the export. A worksheet holds at most XLSX_MAX_ROWS rows;
+larger XLSX exports are refused (see :func:`check_export_size`), so use CSV
+or JSON Lines, or narrow the date range.
+"""
+import csv
+import json
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import JournalEntry
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# (output column, queryset field) in the same order as JournalEntrySerializer.
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('project', 'project_id'),
+    ('project_name', 'project__name'),
+    ('user', 'user_id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('entry_type', 'entry_type'),
+    ('amount', 'amount'),
+    ('date', 'date'),
+    ('account_name', 'account_name'),
+    ('reference_number', 'reference_number'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+WRITE_BUFFER_SIZE = 64 * 1024
+# Excel's worksheet limit, header row included.
+XLSX_MAX_ROWS = 1048576
+
+
+class ExportTooLarge(ValueError):
+    pass
+
+
+def export_queryset(project_id=None, date_from=None, date_to=None):
+    queryset = JournalEntry.objects.all()
+    if project_id:
+        queryset = queryset.filter(project_id=project_id)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset.order_by('date', 'created_at', 'id')
+
+
+def check_export_size(queryset, export_format):
+    """Raise ExportTooLarge if ``queryset`` does not fit in ``export_format``."""
+    if export_format != 'xlsx':
+        return
+    limit = XLSX_MAX_ROWS - 1
+    if queryset.count() > limit:
+        raise ExportTooLarge(
+            f'XLSX exports are limited to {limit} entries; '
+            'narrow the date range or export CSV or JSON Lines instead.'
+        )
+
+
+def iter_rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, 'JOURNAL_EXPORT_CHUNK_SIZE', 2000)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def buffered(pieces, size=WRITE_BUFFER_SIZE):
+    """Join small string pieces into chunks of roughly ``size`` characters."""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def iter_jsonl(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def iter_xlsx(rows, read_size=WRITE_BUFFER_SIZE):
+    # openpyxl can only produce the zip container once the workbook is saved;
+    # write-only mode keeps the sheet on disk while rows are appended, and the
+    # finished file is then streamed from a temporary file.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Journal Entries')
+    sheet.append([name for name, _ in EXPORT_COLUMNS])
+    for count, row in enumerate(rows, 2):
+        # Rows added after check_export_size() counted them.
+        if count > XLSX_MAX_ROWS:
+            raise ExportTooLarge(f'XLSX exports are limited to {XLSX_MAX_ROWS - 1} entries.')
+        sheet.append([str(value) if isinstance(value, uuid.UUID) else value for value in row])
+    with tempfile.TemporaryFile() as handle:
+        workbook.save(handle)
+        handle.seek(0)
+        while True:
+            data = handle.read(read_size)
+            if not data:
+                break
+            yield data
+
+
+def iter_export(queryset, export_format):
+    """Yield encoded chunks of ``queryset`` in ``export_format``."""
+    rows = iter_rows(queryset)
+    if export_format == 'csv':
+        return (chunk.encode('utf-8') for chunk in buffered(iter_csv(rows)))
+    if export_format == 'jsonl':
+        return (chunk.encode('utf-8') for chunk in buffered(iter_jsonl(rows)))
+    if export_format == 'xlsx':
+        return iter_xlsx(rows)
+    raise ValueError(f'Unsupported export format: {export_format}')
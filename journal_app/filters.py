@@ -0,0 +1,98 @@
+"""Query-string filters for the journal entry listings.
+
+Every filter is a plain column comparison, so combinations are answered by
+the JournalEntry indexes rather than a scan:
+
+- ``project`` and ``source_file`` seek their (column, -date, ...) index;
+- ``account`` (exact) and ``account_prefix`` seek entry_account_date_idx,
+  or entry_project_account_idx together with ``project``;
+- ``reference`` seeks entry_reference_idx;
+- ``date_from``/``date_to`` bound the date column of whichever of those
+  indexes is used (entry_date_idx when there is no other filter);
+- ``entry_type`` and ``amount_min``/``amount_max`` are checked on the rows
+  the index yields.
+
+``account_prefix`` is a case-sensitive range (``>= prefix`` and ``< prefix``
+followed by the highest code point) rather than ``startswith``, which SQLite
+runs as a case-insensitive LIKE that cannot use the index.
+"""
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .models import JournalEntry
+
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+def parse_uuid(value):
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValueError('Must be a valid UUID.')
+
+
+def parse_iso_date(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError('Must be a date (YYYY-MM-DD).')
+    return parsed
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError('Must be a number.')
+    if not amount.is_finite():
+        raise ValueError('Must be a number.')
+    return amount
+
+
+def parse_entry_type(value):
+    choices = [choice for choice, _ in JournalEntry.ENTRY_TYPES]
+    if value not in choices:
+        raise ValueError(f"Must be one of: {', '.join(choices)}.")
+    return value
+
+
+def parse_text(value):
+    return value
+
+
+# query parameter -> (parser, lookups built from the parsed value)
+ENTRY_FILTERS = {
+    'project': (parse_uuid, lambda value: {'project_id': value}),
+    'source_file': (parse_uuid, lambda value: {'source_file_id': value}),
+    'date_from': (parse_iso_date, lambda value: {'date__gte': value}),
+    'date_to': (parse_iso_date, lambda value: {'date__lte': value}),
+    'amount_min': (parse_amount, lambda value: {'amount__gte': value}),
+    'amount_max': (parse_amount, lambda value: {'amount__lte': value}),
+    'entry_type': (parse_entry_type, lambda value: {'entry_type': value}),
+    'account': (parse_text, lambda value: {'account_name': value}),
+    'account_prefix': (parse_text, lambda value: {
+        'account_name__gte': value, 'account_name__lt': value + PREFIX_UPPER_BOUND,
+    }),
+    'reference': (parse_text, lambda value: {'reference_number': value}),
+}
+
+
+def filter_entries(queryset, params):
+    """Apply the ENTRY_FILTERS present in ``params``; raises ValidationError for bad values."""
+    lookups, errors = {}, {}
+    for param, (parse, build) in ENTRY_FILTERS.items():
+        value = params.get(param)
+        if value is None or value == '':
+            continue
+        try:
+            lookups.update(build(parse(value)))
+        except ValueError as e:
+            errors[param] = str(e)
+    if errors:
+        raise ValidationError(errors)
+    return queryset.filter(**lookups) if lookups else queryset
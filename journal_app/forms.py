@@ -1,8 +1,12 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
 from .models import UploadedFile, JournalEntry
 import magic
 
 class FileUploadForm(forms.ModelForm):
+    STREAMING_TYPES = ['text/plain', 'text/csv']
+    
     class Meta:
         model = UploadedFile
         fields = ['file']
@@ -18,10 +22,6 @@ class FileUploadForm(forms.ModelForm):
         if not file:
             raise forms.ValidationError("No file selected.")
         
-        # Check file size (10MB limit)
-        if file.size > 10 * 1024 * 1024:
-            raise forms.ValidationError("File size cannot exceed 10MB.")
-        
         # Check file type
         allowed_types = ['application/pdf', 'text/plain', 'text/csv', 
                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
@@ -33,6 +33,15 @@ class FileUploadForm(forms.ModelForm):
         if file_type not in allowed_types:
             raise forms.ValidationError("Unsupported file type. Please upload PDF, TXT, CSV, or Excel files.")
         
+        # Check file size. Text and CSV files are imported in streaming chunks,
+        # so they can be much larger than PDF/Excel, which are parsed in memory.
+        if file_type in self.STREAMING_TYPES:
+            max_size = getattr(settings, 'JOURNAL_STREAMING_UPLOAD_MAX_SIZE', 500 * 1024 * 1024)
+        else:
+            max_size = getattr(settings, 'JOURNAL_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+        if file.size > max_size:
+            raise forms.ValidationError(f"File size cannot exceed {filesizeformat(max_size)}.")
+        
         return file
 
 class JournalEntryForm(forms.ModelForm):
@@ -0,0 +1,163 @@
+"""Database-backed import queue.
+
+``UploadedFile.status`` is the queue: uploads are stored as ``pending`` and a
+worker claims one by flipping it to ``processing`` with a conditional UPDATE,
+so two workers (threads or processes) can never claim the same file. Pending
+files survive restarts and are picked up by the next worker that starts.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .file_processors import FileProcessor
+from .models import JournalEntry, ProcessingLog, UploadedFile
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when accepting another upload would exceed JOURNAL_QUEUE_MAX_PENDING."""
+
+
+def pending_files(file_types=None):
+    queryset = UploadedFile.objects.filter(status='pending').order_by('uploaded_at')
+    if file_types:
+        queryset = queryset.filter(file_type__in=file_types)
+    return queryset
+
+
+def claim_next(file_types=None):
+    """Atomically claim the oldest pending file, or return None if there is none."""
+    # A few candidates are fetched so that losing a race for the first one
+    # does not send the worker back to sleep while work is still queued.
+    for pk in pending_files(file_types).values_list('pk', flat=True)[:10]:
+        claimed = claim(pk)
+        if claimed is not None:
+            return claimed
+    return None
+
+
+def claim(pk):
+    """Claim the pending file ``pk``; None if it is not pending (or another worker got it)."""
+    claimed = UploadedFile.objects.filter(pk=pk, status='pending').update(
+        status='processing', claimed_at=timezone.now()
+    )
+    return UploadedFile.objects.get(pk=pk) if claimed else None
+
+
+def requeue_stale(max_age=None):
+    """Return files that made no progress for ``max_age`` seconds to the queue.
+
+    A worker that dies mid-job leaves its file in ``processing``; this puts it
+    back so a restart does not lose the job. Running jobs are not affected:
+    FileProcessor refreshes ``claimed_at`` every time it commits a batch. The
+    entries a dead job had already committed are deleted, so the retry does
+    not import them twice.
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'JOURNAL_QUEUE_STALE_AFTER', 3600)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    stale = UploadedFile.objects.filter(status='processing', claimed_at__lt=cutoff)
+    requeued = 0
+    for pk in stale.values_list('pk', flat=True):
+        with transaction.atomic():
+            # Re-checked per file: the job may have reported progress since.
+            if not stale.filter(pk=pk).update(status='pending', claimed_at=None, processed_entries_count=0):
+                continue
+            removed, _ = JournalEntry.objects.filter(source_file_id=pk).delete()
+            ProcessingLog.objects.create(
+                uploaded_file_id=pk, level='warning',
+                message=f"Requeued after {max_age}s without progress; "
+                        f"removed {removed} entries from the interrupted run",
+            )
+        requeued += 1
+    return requeued
+
+
+def check_capacity():
+    max_pending = getattr(settings, 'JOURNAL_QUEUE_MAX_PENDING', 100)
+    if max_pending and UploadedFile.objects.filter(status='pending').count() >= max_pending:
+        raise QueueFull(f'The import queue is full ({max_pending} files waiting). Please retry later.')
+
+
+def process_claimed(uploaded_file, cprofile_path=None):
+    try:
+        FileProcessor(uploaded_file, cprofile_path=cprofile_path).process()
+    except Exception:
+        # FileProcessor records its own failures; this only guards the worker loop.
+        logger.exception('Unhandled error processing %s', uploaded_file.pk)
+
+
+class WorkerPool:
+    """A fixed number of worker threads draining the import queue."""
+
+    def __init__(self, workers=None, poll_interval=None, file_types=None):
+        self.workers = workers or getattr(settings, 'JOURNAL_QUEUE_WORKERS', 2)
+        self.poll_interval = poll_interval or getattr(settings, 'JOURNAL_QUEUE_POLL_INTERVAL', 5)
+        self.file_types = file_types
+        self._wakeup = threading.Semaphore(0)
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f'import-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def notify(self):
+        """Wake one idle worker instead of waiting for its next poll."""
+        self._wakeup.release()
+
+    def stop(self, wait=True):
+        self._stopping.set()
+        for _ in self._threads:
+            self._wakeup.release()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def run(self):
+        try:
+            while not self._stopping.is_set():
+                close_old_connections()
+                uploaded_file = claim_next(self.file_types)
+                if uploaded_file is None:
+                    self._wakeup.acquire(timeout=self.poll_interval)
+                    continue
+                process_claimed(uploaded_file)
+        finally:
+            connections.close_all()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """The in-process pool used by the upload views, started on first use.
+
+    Returns None when JOURNAL_QUEUE_IN_PROCESS_WORKERS is 0, i.e. when uploads
+    are drained by a separate ``run_import_workers`` process instead.
+    """
+    global _default_pool
+    workers = getattr(settings, 'JOURNAL_QUEUE_IN_PROCESS_WORKERS', 2)
+    if not workers:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            requeue_stale()
+            _default_pool = WorkerPool(workers=workers).start()
+    return _default_pool
+
+
+def enqueue(uploaded_file):
+    """Signal that ``uploaded_file`` (already saved as pending) is ready to process."""
+    pool = get_default_pool()
+    if pool is not None:
+        transaction.on_commit(pool.notify)
@@ -0,0 +1,201 @@
+"""Declarative line formats for TXT and PDF imports.
+
+A format is declared once as a regular expression with named groups (or as a
+delimiter plus column order, which is compiled into one) and optionally a date
+format. Each line is first checked against a cheap anchored pre-filter for the
+date's shape, so headers, footers and page numbers are rejected without running
+the full pattern, and nothing in the hot path raises for lines that are not
+entries. Dates and amounts are converted by the import's ParsingContext.
+"""
+import re
+
+from .parsing import ParsingContext
+
+ENTRY_FIELDS = ('date', 'title', 'amount', 'entry_type', 'account_name', 'reference_number', 'description')
+
+AMOUNT_PATTERN = r'\(?-?[\d,]*\d(?:\.\d+)?\)?-?'
+# Any numeric date layout, for formats whose date format is inferred.
+DATE_SHAPE = r'\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}'
+# Spellings of the two entry types; anything else is imported by its first
+# letter, as the pipe importer always did, and reported to the caller.
+ENTRY_TYPE_ALIASES = {
+    'debit': 'debit', 'dr': 'debit', 'd': 'debit',
+    'credit': 'credit', 'cr': 'credit', 'c': 'credit',
+}
+
+DATE_DIRECTIVES = {
+    '%Y': r'\d{4}',
+    '%y': r'\d{2}',
+    '%m': r'\d{1,2}',
+    '%d': r'\d{1,2}',
+    '%b': r'[A-Za-z]{3}',
+    '%B': r'[A-Za-z]+',
+}
+
+
+def normalize_entry_type(value):
+    """Return ``(entry_type, recognized)`` for an entry type cell.
+
+    Unknown values are debits if they start with "d" and credits otherwise.
+    """
+    value = value.strip().lower()
+    entry_type = ENTRY_TYPE_ALIASES.get(value)
+    if entry_type is not None:
+        return entry_type, True
+    return ('debit' if value.startswith('d') else 'credit'), False
+
+
+def date_pattern(date_format):
+    """Translate a strptime format into a regular expression for its shape."""
+    if date_format is None:
+        return DATE_SHAPE
+    parts = re.split(r'(%[a-zA-Z])', date_format)
+    return ''.join(DATE_DIRECTIVES.get(part) or re.escape(part) for part in parts if part)
+
+
+class LineFormat:
+    """A compiled line layout: named-group ``pattern`` plus how to convert it.
+
+    ``pattern`` must contain ``date`` and ``amount`` groups, should anchor the
+    date at the start of the line (which is what the pre-filter checks) and
+    should leave surrounding whitespace outside its groups. With
+    ``date_format=None`` the format is inferred from the file's first lines.
+    ``defaults`` fills entry fields the layout does not carry.
+    """
+
+    def __init__(self, name, pattern, date_format=None, defaults=None):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.date_format = date_format
+        self.prefilter = re.compile(r'\s*' + date_pattern(date_format))
+        self.defaults = {'account_name': 'General', 'entry_type': 'debit', **(defaults or {})}
+        self.fields = [name for name in self.regex.groupindex if name in ENTRY_FIELDS]
+
+    def __repr__(self):
+        return f'<LineFormat {self.name}>'
+
+    def looks_like_entry(self, line):
+        return self.prefilter.match(line) is not None
+
+    def match(self, line):
+        """Return the entry fields of ``line`` as strings, or None if it does not match."""
+        found = self.regex.match(line)
+        if found is None:
+            return None
+        fields = dict(self.defaults)
+        for name, value in zip(self.fields, found.group(*self.fields)):
+            if value is not None:
+                fields[name] = value
+        return fields
+
+
+def delimited_format(name, delimiter, columns, date_format=None, defaults=None):
+    """Build a LineFormat for ``delimiter``-separated ``columns``.
+
+    Use ``None`` in ``columns`` for a column to ignore; extra trailing columns
+    are allowed.
+    """
+    column_patterns = {'amount': AMOUNT_PATTERN, 'date': date_pattern(date_format)}
+    separator = r'\s*' + re.escape(delimiter) + r'\s*'
+    cell = '[^' + re.escape(delimiter) + ']*?'
+    groups = [
+        f'(?P<{column}>{column_patterns.get(column, cell)})' if column else cell
+        for column in columns
+    ]
+    pattern = r'\s*' + separator.join(groups) + r'\s*(?:' + re.escape(delimiter) + r'.*)?$'
+    return LineFormat(name, pattern, date_format, defaults)
+
+
+LINE_FORMATS = {}
+
+
+def register_format(line_format):
+    LINE_FORMATS[line_format.name] = line_format
+    return line_format
+
+
+# "2023-12-01 | Sales Revenue | 1000.00 | Credit"
+register_format(delimited_format('pipe', '|', ['date', 'title', 'amount', 'entry_type']))
+
+# The journal report layout of the sample PDFs, whose columns are
+# "Date Journal_ID Account Description Amount DC Posted_By":
+# "2024-04-12 JE100000 Accounts Receivable Payment received 9,507,635.92 Debit erina"
+# The extracted text separates columns and words alike with single spaces.
+# Account names are Title Case and descriptions sentence case, so the account
+# is the shortest run of capitalised words after which the description's
+# second word (if any) is not capitalised.
+register_format(LineFormat(
+    'journal_report',
+    r'\s*(?P<date>\d{4}-\d{2}-\d{2})\s+(?P<reference_number>\S+)\s+'
+    r'(?P<account_name>\S+(?:\s+[A-Z]\S*)*?)\s+(?P<title>\S+(?:\s+(?![A-Z])\S.*?)?)\s+'
+    r'(?P<amount>' + AMOUNT_PATTERN + r')\s+(?P<entry_type>Debit|Credit)\b',
+    date_format='%Y-%m-%d',
+))
+
+
+def detect_format(lines, formats=None):
+    """Return the format matching most of ``lines``, or None if none match any."""
+    best, best_count = None, 0
+    for line_format in (formats or LINE_FORMATS.values()):
+        count = sum(1 for line in lines if line_format.looks_like_entry(line) and line_format.regex.match(line))
+        if count > best_count:
+            best, best_count = line_format, count
+    return best
+
+
+class LineParser:
+    """Detect the layout from the first ``sample_size`` lines, then parse the stream.
+
+    :meth:`parse` yields ``(line, fields)`` for every line that passes the
+    pre-filter; ``fields`` is None when the line looked like an entry but did
+    not match the layout or had an invalid date or amount. Other lines are
+    only counted in ``skipped``. Lines whose entry type is not a known
+    spelling are still parsed (see normalize_entry_type) and passed to
+    ``on_unrecognized_type(line, value, entry_type)``.
+    """
+
+    def __init__(self, formats=None, sample_size=50, context=None, on_unrecognized_type=None):
+        self.formats = list(formats or LINE_FORMATS.values())
+        self.sample_size = sample_size
+        self.context = context or ParsingContext()
+        self.on_unrecognized_type = on_unrecognized_type
+        self.format = None
+        self.lines = 0
+        self.skipped = 0
+
+    def parse(self, lines):
+        lines = iter(lines)
+        sample = []
+        for line in lines:
+            sample.append(line)
+            if len(sample) >= self.sample_size:
+                break
+        self.format = detect_format(sample, self.formats)
+        if self.format is None:
+            self.lines += len(sample) + sum(1 for _ in lines)
+            self.skipped = self.lines
+            return
+
+        self.context.date_format = self.format.date_format
+        self.context.infer_date_format([
+            found.group('date') for found in map(self.format.regex.match, sample) if found
+        ])
+
+        looks_like_entry = self.format.looks_like_entry
+        match = self.format.match
+        convert = self.context.convert
+        for stream in (sample, lines):
+            for line in stream:
+                self.lines += 1
+                if not looks_like_entry(line):
+                    self.skipped += 1
+                    continue
+                fields = match(line)
+                if fields is not None and not convert(fields):
+                    fields = None
+                if fields is not None:
+                    value = fields['entry_type']
+                    fields['entry_type'], recognized = normalize_entry_type(value)
+                    if not recognized and self.on_unrecognized_type is not None:
+                        self.on_unrecognized_type(line, value, fields['entry_type'])
+                yield line, fields
@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.db import connection
+from django.test.utils import override_settings
+
+from journal_app.profiling import peak_rss_mb
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the enclosed block against a throwaway database and media root.
+
+    Benchmarks must never touch the configured database, so this creates a
+    fresh schema the same way the test runner does. SQLite test databases are
+    forced onto a temporary file rather than ``:memory:`` so timings include
+    real disk I/O and can be shared between threads.
+    """
+    workdir = tempfile.mkdtemp(prefix='journal-bench-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(MEDIA_ROOT=workdir):
+            yield workdir
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+ACCOUNTS = ['Cash', 'Revenue', 'Expenses', 'Inventory', 'Accounts Payable', 'Accounts Receivable']
+
+
+def write_sample_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    accounts = ACCOUNTS
+    start = date(2024, 1, 1)
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write('date,title,amount,account,type,reference\n')
+        for i in range(rows):
+            handle.write('{},{},{:.2f},{},{},REF{:07d}\n'.format(
+                start + timedelta(days=rng.randrange(365)),
+                f'Sample entry {i}',
+                rng.uniform(1, 100000),
+                rng.choice(accounts),
+                rng.choice(['Debit', 'Credit']),
+                i,
+            ))
+
+
+def seed_entries(projects, count, batch_size=20000, seed=0, stdout=None):
+    """Insert ``count`` random entries spread over ``projects``, bypassing signals."""
+    from decimal import Decimal
+
+    from django.db import transaction
+
+    from journal_app.models import JournalEntry
+
+    rng = random.Random(seed)
+    start = date(2022, 1, 1)
+    for offset in range(0, count, batch_size):
+        size = min(batch_size, count - offset)
+        with transaction.atomic():
+            JournalEntry.objects.bulk_create([
+                JournalEntry(
+                    project=rng.choice(projects),
+                    title=f'Seeded entry {offset + i}',
+                    entry_type=rng.choice(['debit', 'credit']),
+                    amount=Decimal(rng.randrange(100, 10000000)) / 100,
+                    date=start + timedelta(days=rng.randrange(1095)),
+                    account_name=rng.choice(ACCOUNTS),
+                    reference_number=f'REF{offset + i:09d}',
+                )
+                for i in range(size)
+            ], batch_size=batch_size)
+        if stdout is not None:
+            stdout.write(f'  seeded {offset + size}/{count}', ending='\r')
+    if stdout is not None:
+        stdout.write('')
+
+
+def explain(queryset):
+    """Return SQLite's query plan for ``queryset`` as a list of lines."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            fn()
+        timings.append(timer.elapsed)
+    return min(timings)
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
@@ -0,0 +1,109 @@
+import os
+import statistics
+import threading
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from journal_app.db import DEFAULT_BULK_PRAGMAS, DEFAULT_PRAGMAS
+from journal_app.file_processors import FileProcessor
+from journal_app.models import Project, UploadedFile
+from ._benchmark import Timer, scratch_database, seed_entries, write_sample_csv
+
+MODES = {
+    # Django's defaults: rollback journal, Python's 5 s sqlite3 timeout.
+    'default': ({'journal_mode': 'delete', 'synchronous': 'full'}, {}),
+    'tuned': (DEFAULT_PRAGMAS, {}),
+    'tuned+bulk': (DEFAULT_PRAGMAS, DEFAULT_BULK_PRAGMAS),
+}
+
+
+class Command(BaseCommand):
+    help = 'Time entries API reads from N threads while a CSV import writes, per SQLite PRAGMA set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--think-ms', type=float, default=20,
+                            help='Pause between requests per reader; 0 saturates the GIL and slows the import')
+        parser.add_argument('--rows', type=int, default=50000, help='Rows in the imported CSV')
+        parser.add_argument('--entries', type=int, default=100000, help='Entries seeded before the import')
+        parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated subset of ' + ', '.join(MODES))
+
+    def handle(self, *args, **options):
+        with scratch_database() as workdir:
+            projects = Project.objects.bulk_create(Project(name=f'Project {i}') for i in range(20))
+            seed_entries(projects, options['entries'])
+            source = os.path.join(workdir, 'sample.csv')
+            write_sample_csv(source, options['rows'])
+
+            for mode in options['modes'].split(','):
+                pragmas, bulk_pragmas = MODES[mode]
+                with override_settings(JOURNAL_SQLITE_PRAGMAS=pragmas, JOURNAL_SQLITE_BULK_PRAGMAS=bulk_pragmas,
+                                       JOURNAL_REQUEST_METRICS=False):
+                    # New connections pick up the PRAGMAs for this mode.
+                    connections.close_all()
+                    self.run_mode(mode, source, options['readers'], options['think_ms'] / 1000)
+
+    def run_mode(self, mode, source, readers, think):
+        with open(source, 'rb') as handle:
+            uploaded_file = UploadedFile.objects.create(
+                file=File(handle, name='sample.csv'), original_filename='sample.csv',
+                file_type='csv', file_size=os.path.getsize(source),
+            )
+        connection.close()
+
+        done = threading.Event()
+        latencies = [[] for _ in range(readers)]
+        errors = [0] * readers
+
+        def read(number):
+            client = Client(SERVER_NAME='localhost')
+            try:
+                while not done.is_set():
+                    started = time.perf_counter()
+                    try:
+                        response = client.get('/api/entries/', {'page_size': 50})
+                        ok = response.status_code == 200
+                    except Exception:
+                        ok = False
+                    if ok:
+                        latencies[number].append(time.perf_counter() - started)
+                    else:
+                        errors[number] += 1
+                    done.wait(think)
+            finally:
+                connection.close()
+
+        def write():
+            try:
+                FileProcessor(UploadedFile.objects.get(pk=uploaded_file.pk)).process()
+            finally:
+                connection.close()
+                done.set()
+
+        threads = [threading.Thread(target=read, args=(number,)) for number in range(readers)]
+        for thread in threads:
+            thread.start()
+        with Timer() as timer:
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join()
+        for thread in threads:
+            thread.join()
+
+        uploaded_file.refresh_from_db()
+        samples = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+        if samples:
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            reads = (f'{len(samples) / timer.elapsed:7.1f} reads/sec  p50 {statistics.median(samples) * 1000:6.1f} ms  '
+                     f'p95 {p95 * 1000:6.1f} ms  max {samples[-1] * 1000:7.1f} ms')
+        else:
+            reads = 'no successful reads'
+        self.stdout.write(
+            f'{mode:<11} import {uploaded_file.status} {uploaded_file.processed_entries_count} rows in '
+            f'{timer.elapsed:6.2f}s  |  {readers} readers: {reads}  errors {sum(errors)}'
+        )
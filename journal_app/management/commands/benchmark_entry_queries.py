@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+
+from journal_app.models import JournalEntry, ProcessingLog, Project, UploadedFile
+from ._benchmark import best_of, explain, scratch_database, seed_entries
+
+ACCOUNT_MONTH = {'account': 'Cash', 'date_from': '2023-06-01', 'date_to': '2023-06-30'}
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and report query plans and latency for the entry access paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=2000000)
+        parser.add_argument('--projects', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--compare-without-indexes', action='store_true',
+                            help='Drop the access-path indexes afterwards and measure again')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN output is only implemented for SQLite')
+
+        with scratch_database():
+            self.stdout.write(f"Seeding {options['entries']} entries across {options['projects']} projects...")
+            projects = Project.objects.bulk_create(
+                Project(name=f'Project {i}') for i in range(options['projects'])
+            )
+            seed_entries(projects, options['entries'], stdout=self.stdout)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            self.report(projects[0], options['repeat'])
+            self.report_response_sizes(projects[0])
+            if options['compare_without_indexes']:
+                self.drop_indexes()
+                self.stdout.write(self.style.WARNING('\nWithout access-path indexes:'))
+                self.report(projects[0], options['repeat'])
+
+    def cases(self, project):
+        client = Client(SERVER_NAME='localhost')
+        return [
+            ('ProjectEntriesAPI first 50 rows',
+             JournalEntry.objects.filter(project_id=project.pk)[:50], None),
+            ('ProjectEntriesAPI request',
+             JournalEntry.objects.filter(project_id=project.pk),
+             lambda: client.get(f'/api/projects/{project.pk}/entries/')),
+            ('JournalEntryListCreateAPI first 50 rows',
+             JournalEntry.objects.all()[:50], None),
+            ('JournalEntryListCreateAPI ?project= request',
+             JournalEntry.objects.filter(project_id=project.pk),
+             lambda: client.get('/api/entries/', {'project': project.pk})),
+            ('Project debit total',
+             JournalEntry.objects.filter(project_id=project.pk, entry_type='debit').values('project')
+             .annotate(total=Sum('amount')), None),
+            ('Account month in a project',
+             JournalEntry.objects.filter(project_id=project.pk, account_name='Cash',
+                                         date__gte='2023-06-01', date__lte='2023-06-30')[:50],
+             lambda: client.get('/api/entries/', {**ACCOUNT_MONTH, 'project': project.pk})),
+            ('Account prefix month, debits over 1000',
+             JournalEntry.objects.filter(account_name__gte='Accounts', account_name__lt='Accounts\U0010ffff',
+                                         date__gte='2023-06-01', date__lte='2023-06-30',
+                                         entry_type='debit', amount__gte=1000)[:50],
+             lambda: client.get('/api/entries/', {'account_prefix': 'Accounts', 'date_from': '2023-06-01',
+                                                  'date_to': '2023-06-30', 'entry_type': 'debit',
+                                                  'amount_min': 1000})),
+            ('Reference lookup',
+             JournalEntry.objects.filter(reference_number='REF000000042'), None),
+            ('Pending file scan',
+             UploadedFile.objects.filter(status='pending').order_by('uploaded_at')[:10], None),
+            ('Latest logs for a file',
+             ProcessingLog.objects.filter(uploaded_file_id='00000000000000000000000000000000')[:10], None),
+        ]
+
+    def report(self, project, repeat):
+        for label, queryset, request in self.cases(project):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            for line in explain(queryset):
+                self.stdout.write(f'  plan: {line}')
+            elapsed = best_of(lambda: list(queryset.all()), repeat)
+            self.stdout.write(f'  query: {elapsed * 1000:.2f} ms')
+            if request is not None:
+                # Without the first-page cache, which would answer every repeat.
+                elapsed = best_of(lambda: (cache.clear(), request()), repeat)
+                self.stdout.write(f'  request: {elapsed * 1000:.2f} ms')
+
+    def report_response_sizes(self, project):
+        # Bytes a client downloads to get one account's month in a project:
+        # before filters it had to page through every entry of the project.
+        client = Client(SERVER_NAME='localhost')
+        self.stdout.write(self.style.MIGRATE_HEADING('\nResponse size, one account for one month in a project'))
+        page = client.get('/api/entries/', {'project': project.pk, 'page_size': 1000})
+        rows = JournalEntry.objects.filter(project_id=project.pk).count()
+        per_row = len(page.content) / max(len(page.json()['results']), 1)
+        self.stdout.write(f'  all {rows} project entries, filtered client-side: ~{rows * per_row / 1024:,.0f} KiB')
+        for label, params in (
+            ('?account=&date_from=&date_to=', {}),
+            ('... &fields=date,amount,entry_type', {'fields': 'date,amount,entry_type'}),
+        ):
+            response = client.get('/api/entries/', {**ACCOUNT_MONTH, 'project': project.pk,
+                                                     'page_size': 1000, **params})
+            self.stdout.write(f"  {label:<40} {len(response.content) / 1024:,.1f} KiB, "
+                              f"{len(response.json()['results'])} rows")
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (JournalEntry, UploadedFile, ProcessingLog):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
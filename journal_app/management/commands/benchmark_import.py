@@ -0,0 +1,50 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from journal_app.file_processors import FileProcessor
+from journal_app.models import JournalEntry, UploadedFile
+from ._benchmark import Timer, peak_rss_mb, scratch_database, write_sample_csv
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CSV import throughput for different write batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument(
+            '--batch-sizes', default='1,1000',
+            help='Comma-separated batch sizes to compare; 1 matches the old per-row save() path',
+        )
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        rows = options['rows']
+
+        with scratch_database() as workdir:
+            source = os.path.join(workdir, 'sample.csv')
+            write_sample_csv(source, rows)
+
+            for batch_size in batch_sizes:
+                JournalEntry.objects.all().delete()
+                with open(source, 'rb') as handle:
+                    uploaded_file = UploadedFile.objects.create(
+                        file=File(handle, name='sample.csv'),
+                        original_filename='sample.csv',
+                        file_type='csv',
+                        file_size=os.path.getsize(source),
+                    )
+
+                with Timer() as timer:
+                    FileProcessor(uploaded_file, batch_size=batch_size).process()
+
+                uploaded_file.refresh_from_db()
+                line = (
+                    f'batch_size={batch_size:>6}  rows={uploaded_file.processed_entries_count:>8}  '
+                    f'{timer.elapsed:8.2f}s  {uploaded_file.processed_entries_count / timer.elapsed:10.0f} rows/sec'
+                )
+                rss = peak_rss_mb()
+                if rss is not None:
+                    line += f'  peak RSS {rss:.0f} MB'
+                self.stdout.write(line)
@@ -0,0 +1,74 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from journal_app.line_parsers import LINE_FORMATS, LineParser
+from journal_app.pdf_extraction import iter_pdf_pages
+from ._benchmark import best_of
+
+
+def split_and_strptime(lines):
+    # The per-line parser FileProcessor used before the format registry.
+    entries = 0
+    for line in lines:
+        line = line.strip()
+        try:
+            if '|' in line:
+                parts = [p.strip() for p in line.split('|')]
+                if len(parts) >= 4:
+                    date_str, title, amount_str, entry_type = parts[:4]
+                    abs(Decimal(amount_str))
+                    datetime.strptime(date_str, '%Y-%m-%d').date()
+                    entries += 1
+        except Exception:
+            pass
+    return entries
+
+
+def registry(lines, formats=None):
+    return sum(1 for _, fields in LineParser(formats).parse(lines) if fields is not None)
+
+
+class Command(BaseCommand):
+    help = 'Time line parsing on the text extracted from a PDF (the 1000-entry sample by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=os.path.join(
+            settings.MEDIA_ROOT, 'uploads', 'journal_entries_sample_1000.pdf'
+        ))
+        parser.add_argument('--copies', type=int, default=50,
+                            help='Parse the extracted text this many times over')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        text = '\n'.join(text for _, text, _ in iter_pdf_pages(options['file'], workers=1))
+        lines = text.split('\n') * options['copies']
+        pipe_lines = [
+            f"{fields['date']} | {fields['title']} | {fields['amount']} | {fields['entry_type']}"
+            for _, fields in LineParser().parse(lines) if fields
+        ]
+        day_first_lines = [
+            f"{fields['date']:%d/%m/%Y} | {fields['title']} | {fields['amount']:,} | {fields['entry_type']}"
+            for _, fields in LineParser().parse(lines) if fields
+        ]
+        self.stdout.write(f"{len(lines):,} PDF lines, {len(pipe_lines):,} pipe-delimited lines\n")
+
+        cases = [
+            ('split + strptime, PDF text', split_and_strptime, lines),
+            ('registry, PDF text', registry, lines),
+            ('journal_report only (no detection), PDF text',
+             lambda lines: registry(lines, [LINE_FORMATS['journal_report']]), lines),
+            ('split + strptime, pipe text', split_and_strptime, pipe_lines),
+            ('registry, pipe text', registry, pipe_lines),
+            ('registry, pipe text (dd/mm/yyyy, 1,234.56)', registry, day_first_lines),
+        ]
+        for label, parse, case_lines in cases:
+            elapsed = best_of(lambda: parse(case_lines), options['repeat'])
+            entries = parse(case_lines)
+            self.stdout.write(
+                f"{label:<48} {elapsed * 1000:9.1f} ms  {len(case_lines) / elapsed:12,.0f} lines/sec  "
+                f"{entries:,} entries"
+            )
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from journal_app.models import JournalEntry, Project
+from journal_app.search import SEARCH_FIELDS, SEARCH_ORDERING, search_entries
+from ._benchmark import Timer, best_of, explain, scratch_database, seed_entries
+
+
+
+def cases(entries):
+    # Seeded titles are "Seeded entry <n>" and references REF<n:09d>.
+    n = entries // 2
+    return [
+        ('Single title (every row matches two of the words)', f'Seeded entry {n}'),
+        ('Reference number', f'REF{n:09d}'),
+        ('Reference prefix (10 rows)', f'REF{n // 10:08d}'),
+        ('Account (about 1/6 of rows)', 'Receivable'),
+        ('No match', 'zzyzx'),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare ranked full-text search with the icontains admin search on a seeded throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=1000000)
+        parser.add_argument('--projects', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=50, help='Rows fetched per search, like one API page')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text index is only maintained on SQLite')
+
+        with scratch_database(), override_settings(JOURNAL_REQUEST_METRICS=False):
+            self.stdout.write(f"Seeding {options['entries']} entries (indexed by the FTS triggers)...")
+            projects = Project.objects.bulk_create(
+                Project(name=f'Project {i}') for i in range(options['projects'])
+            )
+            with Timer() as timer:
+                seed_entries(projects, options['entries'], stdout=self.stdout)
+            self.stdout.write(f'  seeded in {timer.elapsed:.1f}s')
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'journal_app_journalentry_fts%'")
+                index_bytes = cursor.fetchone()[0]
+            if index_bytes:
+                self.stdout.write(f'  index size: {index_bytes / 1024 / 1024:.1f} MB')
+
+            client = Client(SERVER_NAME='localhost')
+            limit, repeat = options['limit'], options['repeat']
+            for label, text in cases(options['entries']):
+                ranked = search_entries(JournalEntry.objects.all(), text).order_by(*SEARCH_ORDERING)[:limit]
+                # The admin's previous search: every word in any search field, newest first.
+                scan = JournalEntry.objects.all()
+                for word in text.split():
+                    condition = None
+                    for field in SEARCH_FIELDS + ['project__name']:
+                        term = JournalEntry.objects.filter(**{f'{field}__icontains': word})
+                        condition = term if condition is None else condition | term
+                    scan = scan & condition
+                scan = scan.order_by('-date', '-created_at', '-id')[:limit]
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}: {text!r}'))
+                for name, queryset in (('fts5', ranked), ('icontains', scan)):
+                    elapsed = best_of(lambda: list(queryset.all()), repeat)
+                    self.stdout.write(f'  {name:<10} {elapsed * 1000:9.2f} ms  {len(list(queryset))} rows')
+                    for line in explain(queryset):
+                        self.stdout.write(f'             plan: {line}')
+                # Cleared so every run measures the search rather than the page cache.
+                elapsed = best_of(lambda: (cache.clear(), client.get('/api/entries/', {'q': text, 'page_size': limit})),
+                                  repeat)
+                self.stdout.write(f'  API ?q=    {elapsed * 1000:9.2f} ms')
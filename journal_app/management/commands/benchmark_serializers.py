@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from journal_app.models import JournalEntry, Project
+from journal_app.serializers import JournalEntryRowSerializer, JournalEntrySerializer
+from ._benchmark import best_of, scratch_database, seed_entries
+
+
+class Command(BaseCommand):
+    help = 'Compare JournalEntrySerializer with the .values() row serializer used by the listings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        with scratch_database():
+            projects = Project.objects.bulk_create(Project(name=f'Project {i}') for i in range(20))
+            seed_entries(projects, options['entries'])
+            queryset = JournalEntry.objects.all()
+
+            cases = [
+                ('JournalEntrySerializer (per-row project lookup)',
+                 lambda: renderer.render(JournalEntrySerializer(queryset.all(), many=True).data)),
+                ('JournalEntrySerializer + select_related',
+                 lambda: renderer.render(
+                     JournalEntrySerializer(queryset.select_related('project'), many=True).data
+                 )),
+                ('JournalEntryRowSerializer (.values() rows)',
+                 lambda: renderer.render(JournalEntryRowSerializer(JournalEntryRowSerializer.rows(queryset)).data)),
+            ]
+            outputs = []
+            for label, render in cases:
+                elapsed = best_of(render, options['repeat'])
+                outputs.append(render())
+                self.stdout.write(
+                    f"{label:<50} {elapsed * 1000:9.1f} ms  ({options['entries'] / elapsed:,.0f} entries/sec)"
+                )
+
+            if all(output == outputs[0] for output in outputs):
+                self.stdout.write(self.style.SUCCESS('All serializers produced byte-identical JSON'))
+            else:
+                self.stdout.write(self.style.ERROR('Serializer output differs'))
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from journal_app.exporters import EXPORT_FORMATS, ExportTooLarge, check_export_size, export_queryset, iter_export
+from journal_app.filters import parse_iso_date, parse_uuid
+
+
+class Command(BaseCommand):
+    help = 'Stream journal entries to a CSV, JSON Lines or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', default='csv', choices=list(EXPORT_FORMATS))
+        parser.add_argument('--project', help='Only export entries of this project id')
+        parser.add_argument('--date-from', help='First entry date to include (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='Last entry date to include (YYYY-MM-DD)')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for option in ('date_from', 'date_to'):
+            if options[option]:
+                try:
+                    dates[option] = parse_iso_date(options[option])
+                except ValueError as e:
+                    raise CommandError(f"--{option.replace('_', '-')}: {e}")
+        project_id = None
+        if options['project']:
+            try:
+                project_id = parse_uuid(options['project'])
+            except ValueError as e:
+                raise CommandError(f'--project: {e}')
+
+        queryset = export_queryset(project_id, dates.get('date_from'), dates.get('date_to'))
+        try:
+            check_export_size(queryset, options['format'])
+        except ExportTooLarge as e:
+            raise CommandError(str(e))
+        chunks = iter_export(queryset, options['format'])
+        if options['output']:
+            with open(options['output'], 'wb') as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -1,17 +1,134 @@
-from django.core.management.base import BaseCommand
-from journal_app.models import UploadedFile
-from journal_app.file_processors import FileProcessor
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# journal_app.jobs is imported inside the functions below: with the spawn
+# start method (the default on Windows and macOS) workers import this module
+# before Django is set up.
+
+# Shared by the worker processes: how many more files may be claimed.
+_budget = None
+
+
+def _init_worker(budget):
+    global _budget
+    _budget = budget
+    # Spawned workers start with a fresh interpreter; the settings module is
+    # inherited through DJANGO_SETTINGS_MODULE. Forked ones are already set up.
+    if not apps.ready:
+        django.setup()
+
+
+def _take_one():
+    if _budget is None:
+        return True
+    with _budget.get_lock():
+        if _budget.value <= 0:
+            return False
+        _budget.value -= 1
+        return True
+
+
+def _drain(file_types, verbose, limit=None):
+    """Claim and process files until the queue, ``limit`` or the shared budget is exhausted."""
+    from journal_app.jobs import claim_next, process_claimed
+
+    stats = {'files': 0, 'failed': 0, 'entries': 0}
+    while (limit is None or stats['files'] < limit) and _take_one():
+        file_obj = claim_next(file_types)
+        if file_obj is None:
+            break
+        if verbose:
+            sys.stdout.write(f'Processing {file_obj.original_filename}...\n')
+        process_claimed(file_obj)
+        stats['files'] += 1
+        stats['entries'] += file_obj.processed_entries_count
+        if file_obj.status == 'failed':
+            stats['failed'] += 1
+    connections.close_all()
+    return stats
+
 
 class Command(BaseCommand):
-    help = 'Process pending uploaded files'
+    help = 'Process pending uploaded files once and exit (see run_import_workers for a long-running pool)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes draining the queue')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Process at most this many files')
+        parser.add_argument('--file-type', action='append', dest='file_types',
+                            choices=['pdf', 'txt', 'csv', 'excel'],
+                            help='Only process this file type (repeatable)')
+        parser.add_argument('--file-id',
+                            help='Process only this pending file')
+        parser.add_argument('--cprofile', metavar='PATH',
+                            help='With --file-id, write cProfile stats for the job to PATH')
 
     def handle(self, *args, **options):
-        pending_files = UploadedFile.objects.filter(status='pending')
-        
-        for file_obj in pending_files:
-            self.stdout.write(f'Processing {file_obj.original_filename}...')
-            processor = FileProcessor(file_obj)
-            processor.process()
-            self.stdout.write(
-                self.style.SUCCESS(f'Successfully processed {file_obj.original_filename}')
-            )
\ No newline at end of file
+        if options['file_id']:
+            return self.process_one(options['file_id'], options['cprofile'])
+        if options['cprofile']:
+            raise CommandError('--cprofile profiles a single job; use it with --file-id')
+
+        workers = max(1, options['workers'])
+        file_types = options['file_types']
+        verbose = options['verbosity'] >= 1
+
+        started = time.perf_counter()
+        if workers == 1:
+            results = [_drain(file_types, verbose, options['limit'])]
+        else:
+            # Files are claimed row by row with a conditional UPDATE, so the
+            # workers can pull from the same queue without coordination.
+            context = multiprocessing.get_context()
+            budget = None
+            if options['limit'] is not None:
+                budget = context.Value('i', options['limit'])
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(budget,),
+            ) as pool:
+                futures = [pool.submit(_drain, file_types, verbose) for _ in range(workers)]
+                results = [future.result() for future in futures]
+        elapsed = max(time.perf_counter() - started, 1e-6)
+
+        files = sum(result['files'] for result in results)
+        failed = sum(result['failed'] for result in results)
+        entries = sum(result['entries'] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {files} file(s) ({failed} failed), {entries} entries in {elapsed:.2f}s '
+            f'with {workers} worker(s): {files / elapsed:.2f} files/sec, {entries / elapsed:.0f} entries/sec'
+        ))
+
+    def process_one(self, file_id, cprofile_path):
+        from journal_app.jobs import claim, process_claimed
+
+        try:
+            file_obj = claim(file_id)
+        except ValidationError:
+            raise CommandError(f'{file_id} is not a file id')
+        if file_obj is None:
+            raise CommandError(f'File {file_id} does not exist or is not pending')
+        process_claimed(file_obj, cprofile_path)
+        file_obj.refresh_from_db()
+        self.stdout.write(f'{file_obj.original_filename}: {file_obj.status}, '
+                          f'{file_obj.processed_entries_count} entries')
+        metrics = file_obj.metrics
+        for name, stage in metrics.get('stages', {}).items():
+            cpu = '-' if stage['cpu'] is None else f"{stage['cpu']:.3f}s"
+            self.stdout.write(f"  {name:<8} wall {stage['wall']:8.3f}s  cpu {cpu:>8}  rows {stage['rows']}")
+        self.stdout.write(f"  total    wall {metrics.get('wall', 0):8.3f}s  cpu {metrics.get('cpu', 0):.3f}s  "
+                          f"peak RSS {metrics.get('peak_rss_mb')} MB")
+        if cprofile_path:
+            self.stdout.write(f'cProfile stats written to {cprofile_path}')
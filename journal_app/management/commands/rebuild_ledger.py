@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from journal_app.caching import invalidate_projects
+from journal_app.ledger import (
+    project_totals_mismatches,
+    rebuild_project_totals,
+    rebuild_rollups,
+    rollup_mismatches,
+)
+from journal_app.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --verify, only check) the denormalized project ledger totals and monthly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Report drifted totals and exit non-zero instead of fixing them')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = list(project_totals_mismatches())
+            for project, stored, expected in mismatches:
+                self.stdout.write(
+                    f'{project.name} ({project.pk}): stored count/debits/credits {stored}, expected {expected}'
+                )
+            drifted_rollups = list(rollup_mismatches())
+            for (project_id, month, account_name, entry_type), stored, expected in drifted_rollups:
+                self.stdout.write(
+                    f'Rollup {project_id} {month:%Y-%m} {account_name} {entry_type}: '
+                    f'stored count/amount {stored}, expected {expected}'
+                )
+            if mismatches or drifted_rollups:
+                raise CommandError(
+                    f'{len(mismatches)} project(s) have drifted ledger totals, '
+                    f'{len(drifted_rollups)} rollup row(s) have drifted'
+                )
+            self.stdout.write(self.style.SUCCESS('Project ledger totals and rollups are consistent'))
+            return
+
+        with transaction.atomic():
+            changed = rebuild_project_totals()
+            rollups = rebuild_rollups()
+            invalidate_projects(Project.objects.values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt ledger totals for {changed} project(s) and {rollups} rollup row(s)'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from journal_app.search import check_index, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --verify, only check) the full-text search index over journal entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Check the index and its triggers against the entries table and exit non-zero if either drifted')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text index is only maintained on SQLite')
+        if options['verify']:
+            try:
+                check_index()
+            except DatabaseError as e:
+                raise CommandError(f'The search index does not match the journal entries ({e}); rebuild it')
+            self.stdout.write(self.style.SUCCESS('The search index is consistent'))
+            return
+
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} journal entries'))
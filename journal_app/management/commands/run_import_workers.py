@@ -0,0 +1,76 @@
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_pool(workers, poll_interval, file_types):
+    # Under the spawn start method (Windows, macOS) this runs in a fresh
+    # interpreter, which must set up Django before journal_app.jobs is imported.
+    if not apps.ready:
+        django.setup()
+    from journal_app.jobs import WorkerPool
+
+    pool = WorkerPool(workers=workers, poll_interval=poll_interval, file_types=file_types).start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    # Let in-flight jobs finish; they would otherwise be requeued as stale.
+    pool.stop()
+
+
+class Command(BaseCommand):
+    help = 'Run a long-lived pool of workers that process pending uploaded files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Number of workers (default: JOURNAL_QUEUE_WORKERS)')
+        parser.add_argument('--processes', action='store_true',
+                            help='Run each worker in its own process instead of a thread')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds an idle worker waits before checking the queue again')
+        parser.add_argument('--file-type', action='append', dest='file_types',
+                            choices=['pdf', 'txt', 'csv', 'excel'],
+                            help='Only process this file type (repeatable)')
+
+    def handle(self, *args, **options):
+        from journal_app.jobs import WorkerPool, requeue_stale
+
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale file(s)'))
+
+        workers = options['workers'] or WorkerPool().workers
+        poll_interval = options['poll_interval']
+        file_types = options['file_types']
+        self.stdout.write(
+            f"Starting {workers} import worker {'process' if options['processes'] else 'thread'}(s)"
+        )
+
+        if not options['processes']:
+            run_pool(workers, poll_interval, file_types)
+            return
+
+        # Forked children must not share the parent's database connection.
+        connections.close_all()
+        context = multiprocessing.get_context()
+        children = [
+            context.Process(target=run_pool, args=(1, poll_interval, file_types), name=f'import-worker-{n}')
+            for n in range(workers)
+        ]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+                child.join()
@@ -0,0 +1,115 @@
+"""In-process counters and histograms rendered in the Prometheus text format.
+
+Values live in the memory of the serving process; with several worker
+processes each one reports its own series, so scrape them individually or
+aggregate downstream.
+"""
+import threading
+from collections import defaultdict
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] += amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{format_labels(self.labels, key)} {format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Per-bucket counts plus sum; cumulated when rendered.
+                counts = self.values[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labels, key, [('le', format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labels, key)
+            yield f'{self.name}_sum{labels} {format_value(counts[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, buckets, labels=()):
+        return self.register(Histogram(name, documentation, buckets, labels))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
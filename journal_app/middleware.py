@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'journal_http_request_duration_seconds', 'Time until the view returned a response, by view.',
+    LATENCY_BUCKETS, labels=('view', 'method'),
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    'journal_http_request_db_queries', 'Database queries per request, by view.',
+    QUERY_BUCKETS, labels=('view', 'method'),
+)
+REQUEST_DB_SECONDS = REGISTRY.counter(
+    'journal_http_request_db_seconds_total', 'Time spent executing database queries, by view.',
+    labels=('view', 'method'),
+)
+RESPONSES = REGISTRY.counter(
+    'journal_http_responses_total', 'Responses by view and status code.',
+    labels=('view', 'method', 'status'),
+)
+SLOW_REQUESTS = REGISTRY.counter(
+    'journal_http_slow_requests_total', 'Requests over the latency or query-count threshold, by view.',
+    labels=('view', 'method'),
+)
+
+
+class QueryRecorder:
+    """Database execute wrapper counting and timing the queries of one request."""
+
+    def __init__(self, keep=200):
+        self.keep = keep
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.statements) < self.keep:
+                self.statements.append((sql, elapsed))
+
+    def offenders(self, slowest=5):
+        """Describe the slowest statements and the most repeated one (the usual N+1 signature)."""
+        lines = [f'{elapsed * 1000:8.1f} ms  {sql}' for sql, elapsed in
+                 sorted(self.statements, key=lambda statement: -statement[1])[:slowest]]
+        if self.statements:
+            sql, repeats = Counter(sql for sql, _ in self.statements).most_common(1)[0]
+            if repeats > 1:
+                lines.append(f'repeated {repeats} times: {sql}')
+        return '\n'.join(lines)
+
+
+class RequestMetricsMiddleware:
+    """Per-view latency, query count and DB time, exported by the ``metrics`` view.
+
+    Requests slower than JOURNAL_SLOW_REQUEST_MS or issuing more than
+    JOURNAL_SLOW_REQUEST_QUERIES queries are logged with their slowest and
+    most repeated SQL. With JOURNAL_REQUEST_METRICS = False the middleware
+    removes itself from the chain at startup. Streaming responses are timed
+    until the view returns, so queries made while streaming are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'JOURNAL_REQUEST_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else 'unresolved'
+        labels = {'view': view, 'method': request.method}
+        REQUEST_SECONDS.observe(elapsed, **labels)
+        REQUEST_QUERIES.observe(recorder.count, **labels)
+        REQUEST_DB_SECONDS.inc(recorder.seconds, **labels)
+        RESPONSES.inc(status=str(response.status_code), **labels)
+
+        slow_seconds = getattr(settings, 'JOURNAL_SLOW_REQUEST_MS', 500) / 1000
+        if elapsed >= slow_seconds or recorder.count > getattr(settings, 'JOURNAL_SLOW_REQUEST_QUERIES', 50):
+            SLOW_REQUESTS.inc(**labels)
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries, %.0f ms in the database\n%s',
+                request.method, request.path, view, elapsed * 1000, recorder.count,
+                recorder.seconds * 1000, recorder.offenders(),
+            )
+        return response
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:21
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_project_totals(apps, schema_editor):
+    JournalEntry = apps.get_model('journal_app', 'JournalEntry')
+    Project = apps.get_model('journal_app', 'Project')
+    rows = (
+        JournalEntry.objects.filter(project__isnull=False)
+        .values('project_id')
+        .annotate(
+            count=Count('id'),
+            debits=Sum('amount', filter=Q(entry_type='debit')),
+            credits=Sum('amount', filter=Q(entry_type='credit')),
+        )
+        .order_by()
+    )
+    for row in rows:
+        Project.objects.filter(pk=row['project_id']).update(
+            entry_count=row['count'],
+            debit_total=row['debits'] or 0,
+            credit_total=row['credits'] or 0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0002_uploadedfile_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='credit_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='debit_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='entry_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_project_totals, migrations.RunPython.noop),
+    ]
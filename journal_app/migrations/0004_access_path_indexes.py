@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0003_project_ledger_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['project', '-date', '-created_at'], name='entry_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['-date', '-created_at'], name='entry_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['project', 'entry_type', 'amount'], name='entry_project_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['account_name'], name='entry_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['reference_number'], name='entry_reference_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='processinglog',
+            index=models.Index(fields=['uploaded_file', '-timestamp'], name='log_file_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['status', 'uploaded_at'], name='upload_status_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0004_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='journalentry',
+            name='entry_project_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='journalentry',
+            name='entry_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['project', '-date', '-created_at', '-id'], name='entry_project_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['-date', '-created_at', '-id'], name='entry_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadedfile',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='upload_uploaded_at_idx'),
+        ),
+    ]
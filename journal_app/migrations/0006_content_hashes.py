@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:32
+
+import hashlib
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_fingerprints(apps, schema_editor):
+    # Frozen copy of JournalEntry.compute_fingerprint at the time of writing.
+    JournalEntry = apps.get_model('journal_app', 'JournalEntry')
+    batch = []
+    for entry in JournalEntry.objects.only(
+        'id', 'date', 'amount', 'account_name', 'reference_number', 'entry_type'
+    ).iterator(chunk_size=2000):
+        key = '|'.join([
+            str(entry.date), str(Decimal(str(entry.amount)).quantize(Decimal('0.01'))),
+            entry.account_name.strip().lower(), entry.reference_number.strip(), entry.entry_type
+        ])
+        entry.fingerprint = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        batch.append(entry)
+        if len(batch) >= 500:
+            JournalEntry.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    if batch:
+        JournalEntry.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalentry',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['project', 'fingerprint'], name='entry_fingerprint_idx'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
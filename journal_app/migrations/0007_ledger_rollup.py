@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:33
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def backfill_ledger_rollups(apps, schema_editor):
+    JournalEntry = apps.get_model('journal_app', 'JournalEntry')
+    LedgerRollup = apps.get_model('journal_app', 'LedgerRollup')
+    rows = (
+        JournalEntry.objects.filter(project__isnull=False)
+        .annotate(month=TruncMonth('date'))
+        .values('project_id', 'month', 'account_name', 'entry_type')
+        .annotate(count=Count('id'), total=Sum('amount'))
+        .order_by()
+    )
+    LedgerRollup.objects.bulk_create(
+        (
+            LedgerRollup(
+                project_id=row['project_id'],
+                month=row['month'],
+                account_name=row['account_name'],
+                entry_type=row['entry_type'],
+                entry_count=row['count'],
+                amount_total=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0006_content_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_name', models.CharField(max_length=100)),
+                ('entry_type', models.CharField(choices=[('debit', 'Debit'), ('credit', 'Credit')], max_length=10)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('entry_count', models.IntegerField(default=0)),
+                ('amount_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_rollups', to='journal_app.project')),
+            ],
+            options={
+                'ordering': ['month', 'account_name', 'entry_type'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerrollup',
+            constraint=models.UniqueConstraint(fields=('project', 'month', 'account_name', 'entry_type'), name='ledger_rollup_key'),
+        ),
+        migrations.RunPython(backfill_ledger_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0007_ledger_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
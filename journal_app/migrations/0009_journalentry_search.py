@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:05
+
+from django.db import migrations
+
+COLUMNS = 'title, description, account_name, reference_number'
+OLD = 'old.title, old.description, old.account_name, old.reference_number'
+NEW = 'new.title, new.description, new.account_name, new.reference_number'
+
+# External-content FTS5 index: the text lives only in journal_app_journalentry
+# and the index is keyed by its rowid. Triggers keep it in step with every
+# write, including bulk_create and queryset.update()/delete().
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE journal_app_journalentry_fts USING fts5(
+        {COLUMNS}, content='journal_app_journalentry', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_insert AFTER INSERT ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS}) VALUES (new.rowid, {NEW});
+    END""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_delete AFTER DELETE ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.rowid, {OLD});
+    END""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_update AFTER UPDATE OF {COLUMNS} ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.rowid, {OLD});
+        INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS}) VALUES (new.rowid, {NEW});
+    END""",
+    # Title matches weigh most, then account and reference, then description.
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 5.0)')",
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS journal_app_journalentry_fts_insert',
+    'DROP TRIGGER IF EXISTS journal_app_journalentry_fts_delete',
+    'DROP TRIGGER IF EXISTS journal_app_journalentry_fts_update',
+    'DROP TABLE IF EXISTS journal_app_journalentry_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other backends search with icontains (see journal_app.search).
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0008_uploadedfile_metrics'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0009_journalentry_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='journalentry',
+            name='entry_account_idx',
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='source_file',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='journal_entries', to='journal_app.uploadedfile'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['account_name', '-date', '-created_at', '-id'], name='entry_account_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['project', 'account_name', '-date', '-created_at', '-id'], name='entry_project_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['source_file', '-date', '-created_at', '-id'], name='entry_source_date_idx'),
+        ),
+    ]
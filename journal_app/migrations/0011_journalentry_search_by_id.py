@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+COLUMNS = 'title, description, account_name, reference_number'
+OLD = 'old.title, old.description, old.account_name, old.reference_number'
+NEW = 'new.title, new.description, new.account_name, new.reference_number'
+SET_NEW = ', '.join(f'{column} = new.{column}' for column in COLUMNS.split(', '))
+
+# 0009 keyed the index by the entries table's implicit rowid, which a table
+# rebuild renumbers. The index now keeps its own copy of the text, and
+# journal_app_journalentry_fts_ids maps its rowids to entry ids.
+OLD_TRIGGERS = [
+    'journal_app_journalentry_fts_insert',
+    'journal_app_journalentry_fts_delete',
+    'journal_app_journalentry_fts_update',
+]
+
+CREATE_SQL = [
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in OLD_TRIGGERS),
+    'DROP TABLE IF EXISTS journal_app_journalentry_fts',
+    """CREATE TABLE journal_app_journalentry_fts_ids (
+        rowid INTEGER PRIMARY KEY, entry_id char(32) NOT NULL UNIQUE
+    )""",
+    f"""CREATE VIRTUAL TABLE journal_app_journalentry_fts USING fts5(
+        {COLUMNS}, tokenize='unicode61 remove_diacritics 2'
+    )""",
+    'INSERT INTO journal_app_journalentry_fts_ids(entry_id) SELECT id FROM journal_app_journalentry',
+    f"""INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS})
+        SELECT ids.rowid, e.title, e.description, e.account_name, e.reference_number
+        FROM journal_app_journalentry_fts_ids ids JOIN journal_app_journalentry e ON e.id = ids.entry_id""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_insert AFTER INSERT ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts_ids(entry_id) VALUES (new.id);
+        INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS})
+        VALUES ((SELECT rowid FROM journal_app_journalentry_fts_ids WHERE entry_id = new.id), {NEW});
+    END""",
+    """CREATE TRIGGER journal_app_journalentry_fts_delete AFTER DELETE ON journal_app_journalentry BEGIN
+        DELETE FROM journal_app_journalentry_fts
+        WHERE rowid = (SELECT rowid FROM journal_app_journalentry_fts_ids WHERE entry_id = old.id);
+        DELETE FROM journal_app_journalentry_fts_ids WHERE entry_id = old.id;
+    END""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_update AFTER UPDATE OF {COLUMNS} ON journal_app_journalentry BEGIN
+        UPDATE journal_app_journalentry_fts SET {SET_NEW}
+        WHERE rowid = (SELECT rowid FROM journal_app_journalentry_fts_ids WHERE entry_id = new.id);
+    END""",
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 5.0)')",
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts) VALUES ('optimize')",
+]
+
+# Back to the rowid-keyed index of 0009.
+REVERSE_SQL = [
+    *(f'DROP TRIGGER IF EXISTS {name}' for name in OLD_TRIGGERS),
+    'DROP TABLE IF EXISTS journal_app_journalentry_fts',
+    'DROP TABLE IF EXISTS journal_app_journalentry_fts_ids',
+    f"""CREATE VIRTUAL TABLE journal_app_journalentry_fts USING fts5(
+        {COLUMNS}, content='journal_app_journalentry', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_insert AFTER INSERT ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS}) VALUES (new.rowid, {NEW});
+    END""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_delete AFTER DELETE ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.rowid, {OLD});
+    END""",
+    f"""CREATE TRIGGER journal_app_journalentry_fts_update AFTER UPDATE OF {COLUMNS} ON journal_app_journalentry BEGIN
+        INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rowid, {COLUMNS})
+        VALUES ('delete', old.rowid, {OLD});
+        INSERT INTO journal_app_journalentry_fts(rowid, {COLUMNS}) VALUES (new.rowid, {NEW});
+    END""",
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0, 5.0)')",
+    "INSERT INTO journal_app_journalentry_fts(journal_app_journalentry_fts) VALUES ('rebuild')",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other backends search with icontains (see journal_app.search).
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0010_entry_filters'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(REVERSE_SQL)),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# entry_project_date_idx, entry_project_type_idx, entry_project_account_idx
+# and entry_fingerprint_idx all lead with project_id, so the foreign key's own
+# index only costs writes. Dropped directly: AlterField would rebuild the
+# table on SQLite, which also drops the search index triggers.
+INDEX_NAME = 'journal_app_journalentry_project_id_3a6536dc'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal_app', '0011_journalentry_search_by_id'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='journalentry',
+                    name='project',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='journal_entries', to='journal_app.project'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    f'DROP INDEX IF EXISTS {INDEX_NAME}',
+                    f'CREATE INDEX {INDEX_NAME} ON journal_app_journalentry (project_id)',
+                ),
+            ],
+        ),
+    ]
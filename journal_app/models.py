@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from decimal import Decimal
+import hashlib
 import uuid
 
 class Project(models.Model):
@@ -19,36 +21,90 @@ class Project(models.Model):
     end_date = models.DateField(null=True, blank=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='owned_projects')
     team_members = models.ManyToManyField(User, blank=True, related_name='projects')
+    # Running ledger totals, maintained by journal_app.ledger on every
+    # JournalEntry write (see `manage.py rebuild_ledger` to verify/repair).
+    entry_count = models.PositiveIntegerField(default=0, editable=False)
+    debit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0, editable=False)
+    credit_total = models.DecimalField(max_digits=18, decimal_places=2, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    LEDGER_TOTAL_FIELDS = ('entry_count', 'debit_total', 'credit_total')
+    
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # Never write the totals back from a (possibly stale) instance; they
+        # are only changed through F() updates so concurrent imports are safe.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LEDGER_TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def total_entries(self):
-        return self.journal_entries.count()
+        return self.entry_count
     
+    # ``or 0`` keeps the API rendering a project without entries as 0, as
+    # when the totals were aggregated on every read.
     @property
     def total_debits(self):
-        from django.db.models import Sum
-        result = self.journal_entries.filter(entry_type='debit').aggregate(total=Sum('amount'))
-        return result['total'] or 0
+        return self.debit_total or 0
     
     @property
     def total_credits(self):
-        from django.db.models import Sum
-        result = self.journal_entries.filter(entry_type='credit').aggregate(total=Sum('amount'))
-        return result['total'] or 0
+        return self.credit_total or 0
     
     @property
     def net_amount(self):
         return self.total_credits - self.total_debits
 
 
+class JournalEntryQuerySet(models.QuerySet):
+    def delete(self):
+        from .signals import ledger_entries_deleted
+        
+        with transaction.atomic(using=self.db):
+            ledger_entries_deleted.send(sender=self.model, queryset=self)
+            return super().delete()
+    
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    # Entries per ``pk__in`` query when update() re-reads the rows it
+    # changed. bulk_update() also writes through update(), once per batch.
+    LEDGER_CHUNK_SIZE = 500
+
+    def update(self, **kwargs):
+        from .signals import LEDGER_FIELDS, entries_updated, ledger_entries_deleted, ledger_entries_updated
+
+        if not LEDGER_FIELDS & set(kwargs):
+            with transaction.atomic(using=self.db):
+                entries_updated.send(sender=self.model, queryset=self)
+                return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            # The filter may no longer match once the fields change, so the
+            # old values are subtracted and the new ones added by primary key.
+            pks = list(self.values_list('pk', flat=True).order_by())
+            self._send_by_pk(ledger_entries_deleted, pks)
+            rows = super().update(**kwargs)
+            self._send_by_pk(ledger_entries_updated, pks)
+            return rows
+
+    update.alters_data = True
+
+    def _send_by_pk(self, signal, pks):
+        entries = self.model._base_manager.using(self.db)
+        for start in range(0, len(pks), self.LEDGER_CHUNK_SIZE):
+            signal.send(sender=self.model, queryset=entries.filter(pk__in=pks[start:start + self.LEDGER_CHUNK_SIZE]))
+
+
 class JournalEntry(models.Model):
     ENTRY_TYPES = [
         ('debit', 'Debit'),
@@ -56,7 +112,10 @@ class JournalEntry(models.Model):
     ]
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='journal_entries', null=True, blank=True)
+    # Indexed by the composite indexes below that lead with project.
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, related_name='journal_entries', null=True, blank=True, db_index=False
+    )
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -65,15 +124,93 @@ class JournalEntry(models.Model):
     date = models.DateField()
     account_name = models.CharField(max_length=100)
     reference_number = models.CharField(max_length=50, blank=True)
+    # Hash of the business fields, used to recognise re-imported rows.
+    fingerprint = models.CharField(max_length=64, blank=True, editable=False)
+    # The upload the entry was imported from; None for entries made by hand
+    # or through the API. Indexed by entry_source_date_idx below.
+    source_file = models.ForeignKey(
+        'UploadedFile', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='journal_entries', db_index=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = JournalEntryQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name_plural = "Journal Entries"
+        indexes = [
+            # Listing in Meta.ordering, with and without a project filter.
+            # id is the final tie-breaker of the keyset pagination cursor.
+            models.Index(fields=['project', '-date', '-created_at', '-id'], name='entry_project_date_idx'),
+            models.Index(fields=['-date', '-created_at', '-id'], name='entry_date_idx'),
+            # Debit/credit sums per project; amount is included so the sums
+            # are answered from the index alone.
+            models.Index(fields=['project', 'entry_type', 'amount'], name='entry_project_type_idx'),
+            # Entry API filters (journal_app.filters): an account, optionally
+            # within a project, over a date range, already in listing order.
+            models.Index(fields=['account_name', '-date', '-created_at', '-id'], name='entry_account_date_idx'),
+            models.Index(
+                fields=['project', 'account_name', '-date', '-created_at', '-id'], name='entry_project_account_idx'
+            ),
+            models.Index(fields=['source_file', '-date', '-created_at', '-id'], name='entry_source_date_idx'),
+            models.Index(fields=['reference_number'], name='entry_reference_idx'),
+            models.Index(fields=['project', 'fingerprint'], name='entry_fingerprint_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.amount} ({self.entry_type})"
+    
+    def compute_fingerprint(self):
+        amount = Decimal(str(self.amount)).quantize(Decimal('0.01'))
+        key = '|'.join([
+            str(self.date), str(amount), self.account_name.strip().lower(),
+            self.reference_number.strip(), self.entry_type
+        ])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.compute_fingerprint()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'fingerprint'}
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        # Sends ledger_entries_removed itself; see signals.py for why there
+        # is no post_delete receiver.
+        from .signals import ledger_entries_removed
+        
+        using = kwargs.get('using') or router.db_for_write(JournalEntry, instance=self)
+        with transaction.atomic(using=using):
+            deleted = super().delete(*args, **kwargs)
+            ledger_entries_removed.send(sender=JournalEntry, entries=[self])
+        return deleted
+
+
+class LedgerRollup(models.Model):
+    """Per-month totals of a project's entries by account and entry type.
+    
+    Maintained incrementally by journal_app.ledger so that reports read a
+    handful of rows per account and month instead of scanning JournalEntry.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='ledger_rollups')
+    account_name = models.CharField(max_length=100)
+    entry_type = models.CharField(max_length=10, choices=JournalEntry.ENTRY_TYPES)
+    month = models.DateField(help_text='First day of the month')
+    entry_count = models.IntegerField(default=0)
+    amount_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['month', 'account_name', 'entry_type']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['project', 'month', 'account_name', 'entry_type'], name='ledger_rollup_key'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.account_name} {self.month:%Y-%m} {self.entry_type}: {self.amount_total}"
 
 
 class UploadedFile(models.Model):
@@ -97,14 +234,23 @@ class UploadedFile(models.Model):
     original_filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=10, choices=FILE_TYPES)
     file_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=PROCESSING_STATUS, default='pending')
     error_message = models.TextField(blank=True)
     processed_entries_count = models.PositiveIntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # Per-stage timings, row counts and peak memory (journal_app.profiling)
+    metrics = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            # Queue scan: oldest pending file first.
+            models.Index(fields=['status', 'uploaded_at'], name='upload_status_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='upload_uploaded_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.original_filename} ({self.file_type})"
@@ -122,6 +268,9 @@ class ProcessingLog(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['uploaded_file', '-timestamp'], name='log_file_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.level}: {self.message[:50]}"
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Keyset (cursor) pagination.
+
+Pages are located by the sort key of the last row seen rather than by an
+OFFSET, so fetching page 10,000 costs the same index seek as page 1 and no
+COUNT(*) is ever needed. The ordering must end in a unique column so that the
+key identifies exactly one row.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(position, reverse=False):
+    payload = json.dumps({'p': [str(value) for value in position], 'r': int(reverse)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields=None):
+    """Return ``(position, reverse)``; raises ValueError for a malformed cursor.
+
+    With ``fields`` (see ordering_fields) the position must have one value
+    per field, and each is converted with the field's ``to_python``.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position, reverse = payload['p'], bool(payload['r'])
+    except (TypeError, KeyError, UnicodeDecodeError, json.JSONDecodeError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(position, list) or not position or (fields is not None and len(position) != len(fields)):
+        raise ValueError('Invalid cursor')
+    if fields is not None:
+        try:
+            position = [field.to_python(value) for field, value in zip(fields, position)]
+        except (ValidationError, TypeError, ValueError) as e:
+            raise ValueError('Invalid cursor') from e
+    if any(value is None for value in position):
+        raise ValueError('Invalid cursor')
+    return position, reverse
+
+
+def ordering_fields(queryset, ordering):
+    """The model field, or annotation output field, behind each column of ``ordering``."""
+    annotations = queryset.query.annotations
+    return [
+        annotations[name].output_field if name in annotations else queryset.model._meta.get_field(name)
+        for name in (field.lstrip('-') for field in ordering)
+    ]
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+def keyset_filter(ordering, position):
+    """Q selecting the rows that sort strictly after ``position`` in ``ordering``.
+
+    Expands the row-value comparison ``(a, b, c) > (x, y, z)`` and adds an
+    inclusive bound on the leading column so the database can seek the index
+    instead of filtering every row before the cursor.
+    """
+    names = [field.lstrip('-') for field in ordering]
+    lookups = ['__lt' if field.startswith('-') else '__gt' for field in ordering]
+    condition = Q(**{names[-1] + lookups[-1]: position[-1]})
+    for name, lookup, value in reversed(list(zip(names[:-1], lookups[:-1], position[:-1]))):
+        condition = Q(**{name + lookup: value}) | (Q(**{name: value}) & condition)
+    return Q(**{names[0] + lookups[0] + 'e': position[0]}) & condition
+
+
+def item_position(item, ordering):
+    names = [field.lstrip('-') for field in ordering]
+    if isinstance(item, dict):
+        return [item[name] for name in names]
+    return [getattr(item, name) for name in names]
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate_keyset(queryset, ordering, page_size, cursor=None):
+    """Return the KeysetPage of ``queryset`` that ``cursor`` points at.
+
+    Works for model instances and ``.values()`` rows alike, as long as the
+    ordering columns are selected.
+    """
+    position, reverse = decode_cursor(cursor, ordering_fields(queryset, ordering)) if cursor else (None, False)
+    effective = reverse_ordering(ordering) if reverse else tuple(ordering)
+    queryset = queryset.order_by(*effective)
+    if position is not None:
+        queryset = queryset.filter(keyset_filter(effective, position))
+
+    # One extra row tells us whether there is anything beyond this page.
+    rows = list(queryset[:page_size + 1])
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    if reverse:
+        items.reverse()
+
+    if not items:
+        return KeysetPage(items)
+    has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(item_position(items[-1], ordering)) if has_next else None,
+        previous_cursor=encode_cursor(item_position(items[0], ordering), reverse=True) if has_previous else None,
+    )
+
+
+class KeysetPagination(BasePagination):
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    # Clients may ask for up to max_page_size rows with ?page_size=.
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        try:
+            self.page = paginate_keyset(
+                queryset, self.get_ordering(view), page_size, request.query_params.get(self.cursor_query_param)
+            )
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        return self.page.items
+
+    def get_ordering(self, view):
+        # Views may order some requests differently, e.g. ranked search results.
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering(self.ordering)
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.get_link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self.get_link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class JournalEntryPagination(KeysetPagination):
+    ordering = ('-date', '-created_at', '-id')
+
+
+class UploadedFilePagination(KeysetPagination):
+    ordering = ('-uploaded_at', '-id')
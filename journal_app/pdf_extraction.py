@@ -0,0 +1,97 @@
+"""Page-parallel PDF text extraction.
+
+PyPDF2 text extraction is pure Python and CPU bound, so pages are extracted in
+worker processes rather than threads. This module deliberately avoids Django
+imports: worker processes are spawned fresh and only need PyPDF2.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+
+# One pool per process, started by the first document large enough to need it
+# and shared by every later one, so jobs do not each pay for spawning workers.
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def get_pool(workers):
+    """Return the shared pool, replacing it if it has fewer than ``workers`` processes."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                # Work already submitted to the old pool still completes.
+                _pool.shutdown(wait=False)
+            # Spawned workers do not inherit the parent's threads or DB connections.
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def discard_pool(pool):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_workers = None, 0
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool, _pool_workers = None, 0
+
+
+def extract_page_range(path, start, stop):
+    """Return ``(page_number, text, seconds)`` for pages ``start <= n < stop``."""
+    reader = PyPDF2.PdfReader(path)
+    results = []
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = reader.pages[index].extract_text() or ''
+        results.append((index + 1, text, time.perf_counter() - started))
+    return results
+
+
+def iter_pdf_pages(path, workers=None, pages_per_task=8, min_pool_pages=64):
+    """Yield ``(page_number, text, seconds)`` for every page, in page order.
+
+    Pages are handed out to the shared pool in runs of ``pages_per_task`` so
+    each worker parses the document once per run rather than once per page.
+    ``workers`` (default: one per CPU) is capped at the CPUs this process may
+    use. Documents under ``min_pool_pages`` pages, or a single worker, are
+    extracted in-process: below that, handing pages to other processes costs
+    more than it saves.
+    """
+    workers = min(workers or available_cpus(), available_cpus())
+    page_count = len(PyPDF2.PdfReader(path).pages)
+
+    if workers <= 1 or page_count < max(min_pool_pages, 2 * pages_per_task):
+        yield from extract_page_range(path, 0, page_count)
+        return
+
+    starts = list(range(0, page_count, pages_per_task))
+    stops = [min(start + pages_per_task, page_count) for start in starts]
+    pool = get_pool(workers)
+    try:
+        for results in pool.map(extract_page_range, [path] * len(starts), starts, stops):
+            yield from results
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next document starts a new pool.
+        discard_pool(pool)
+        raise
@@ -0,0 +1,106 @@
+"""Per-stage timing of import jobs.
+
+An ImportProfile records, for each named stage, wall and CPU seconds, call and
+row counts. Stages nest: time spent in an inner stage (typically ``write``
+inside ``map``) is excluded from the outer one, so the stages of a job add up
+to its total. CPU time is per thread, which matches the in-process worker
+threads; PDF pages extracted in worker processes show up as ``extract`` wall
+time only.
+"""
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None if unavailable."""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ImportProfile:
+    def __init__(self, stages=None):
+        self.stages = {name: dict(stage) for name, stage in (stages or {}).items()}
+        self._children = []
+        self._started = None
+
+    @classmethod
+    def from_metrics(cls, metrics):
+        """Continue a profile stored by :meth:`as_dict` (the upload views record ``sniff``)."""
+        return cls((metrics or {}).get('stages'))
+
+    def add(self, name, wall, cpu=None, rows=0, calls=1):
+        """Record ``wall``/``cpu`` seconds against ``name`` and exclude them from the enclosing stage.
+
+        ``cpu=None`` is for stages timed too finely to read the CPU clock; their
+        CPU time stays with the enclosing stage.
+        """
+        stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': None, 'calls': 0, 'rows': 0})
+        stage['wall'] += wall
+        if cpu is not None:
+            stage['cpu'] = (stage['cpu'] or 0.0) + cpu
+        stage['calls'] += calls
+        stage['rows'] += rows
+        if self._children:
+            self._children[-1][0] += wall
+            self._children[-1][1] += cpu or 0.0
+
+    def count(self, name, rows):
+        self.stages.setdefault(name, {'wall': 0.0, 'cpu': None, 'calls': 0, 'rows': 0})['rows'] += rows
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        self._children.append([0.0, 0.0])
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            child_wall, child_cpu = self._children.pop()
+            self.add(name, wall - child_wall, cpu - child_cpu, rows)
+            # add() charged only this stage's own time to the parent.
+            if self._children:
+                self._children[-1][0] += child_wall
+                self._children[-1][1] += child_cpu
+
+    def timed(self, iterable, name):
+        """Yield from ``iterable``, charging the time spent producing each item to ``name``."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def start(self):
+        self._started = (time.perf_counter(), time.thread_time(), peak_rss_mb())
+
+    def as_dict(self):
+        record = {
+            'stages': {
+                name: {
+                    'wall': round(stage['wall'], 4),
+                    'cpu': None if stage['cpu'] is None else round(stage['cpu'], 4),
+                    'calls': stage['calls'],
+                    'rows': stage['rows'],
+                }
+                for name, stage in self.stages.items()
+            },
+        }
+        if self._started is not None:
+            wall, cpu, rss = self._started
+            peak = peak_rss_mb()
+            record.update({
+                'wall': round(time.perf_counter() - wall, 4),
+                'cpu': round(time.thread_time() - cpu, 4),
+                'peak_rss_mb': None if peak is None else round(peak, 1),
+                'peak_rss_growth_mb': None if peak is None else round(peak - rss, 1),
+            })
+        return record
@@ -0,0 +1,168 @@
+"""Full-text search over journal entries.
+
+On SQLite, entries are indexed by the FTS5 table ``journal_app_journalentry_fts``
+(migrations 0009 and 0011) over title, description, account name and
+reference number; triggers keep it current on every insert, update and
+delete, bulk imports included. Each word of a search is matched as a word
+prefix, so "inv" finds "Invoice" but, unlike the admin's old ``icontains``,
+"voice" does not.
+
+Index rows are keyed by entry id through ``journal_app_journalentry_fts_ids``
+(index rowid -> entry id), so ``VACUUM`` and table rebuilds, which renumber
+the entries table's own rowids, leave the index valid. A migration that
+rebuilds the entries table does drop the triggers, though: run
+``manage.py rebuild_search_index`` after one (``--verify`` reports missing
+triggers). Other database backends fall back to ``icontains`` on the same
+columns, unranked.
+"""
+import re
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import JournalEntry, Project
+
+FTS_TABLE = 'journal_app_journalentry_fts'
+IDS_TABLE = 'journal_app_journalentry_fts_ids'
+SEARCH_FIELDS = ['title', 'description', 'account_name', 'reference_number']
+ENTRIES_TABLE = JournalEntry._meta.db_table
+COLUMNS = ', '.join(SEARCH_FIELDS)
+# Title matches weigh most, then account and reference, then description.
+RANK = 'bm25(10.0, 1.0, 5.0, 5.0)'
+
+# The index keeps its own copy of the text, so a deleted or updated entry is
+# removed from it without reading the entries table.
+TABLES_SQL = [
+    f'CREATE TABLE IF NOT EXISTS {IDS_TABLE} (rowid INTEGER PRIMARY KEY, entry_id char(32) NOT NULL UNIQUE)',
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {COLUMNS}, tokenize='unicode61 remove_diacritics 2'
+    )""",
+]
+INDEX_ROWID = f'(SELECT rowid FROM {IDS_TABLE} WHERE entry_id = {{}}.id)'
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': f"""AFTER INSERT ON {ENTRIES_TABLE} BEGIN
+        INSERT INTO {IDS_TABLE}(entry_id) VALUES (new.id);
+        INSERT INTO {FTS_TABLE}(rowid, {COLUMNS})
+        VALUES ({INDEX_ROWID.format('new')}, {', '.join('new.' + field for field in SEARCH_FIELDS)});
+    END""",
+    f'{FTS_TABLE}_delete': f"""AFTER DELETE ON {ENTRIES_TABLE} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = {INDEX_ROWID.format('old')};
+        DELETE FROM {IDS_TABLE} WHERE entry_id = old.id;
+    END""",
+    f'{FTS_TABLE}_update': f"""AFTER UPDATE OF {COLUMNS} ON {ENTRIES_TABLE} BEGIN
+        UPDATE {FTS_TABLE} SET {', '.join(f'{field} = new.{field}' for field in SEARCH_FIELDS)}
+        WHERE rowid = {INDEX_ROWID.format('new')};
+    END""",
+}
+# Keyset ordering of ranked results: best bm25 score (the lowest) first.
+SEARCH_ORDERING = ('search_rank', 'id')
+
+WORD = re.compile(r'\w', re.UNICODE)
+
+
+def match_expression(text):
+    """FTS5 query for ``text``: every word must match as a prefix. None if ``text`` has no words."""
+    terms = [
+        '"{}"*'.format(token.replace('"', '""'))
+        for token in text.split() if WORD.search(token)
+    ]
+    return ' '.join(terms) or None
+
+
+def uses_index(queryset):
+    return connections[queryset.db].vendor == 'sqlite'
+
+
+def icontains_filter(text):
+    condition = Q()
+    for token in text.split():
+        condition &= Q(*(Q(**{f'{field}__icontains': token}) for field in SEARCH_FIELDS), _connector=Q.OR)
+    return condition
+
+
+def search_entries(queryset, text):
+    """Filter ``queryset`` (instances or ``.values()`` rows) to entries matching
+    ``text``, annotated with ``search_rank`` for ordering by SEARCH_ORDERING."""
+    expression = match_expression(text)
+    if expression is None or not uses_index(queryset):
+        queryset = queryset.none() if expression is None else queryset.filter(icontains_filter(text))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    table = JournalEntry._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE, IDS_TABLE],
+        where=[
+            f'{IDS_TABLE}.rowid = {FTS_TABLE}.rowid', f'{table}.id = {IDS_TABLE}.entry_id', f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[expression],
+    ).annotate(search_rank=RawSQL(f'{FTS_TABLE}.rank', (), output_field=FloatField()))
+
+
+def search_filter(text):
+    """Q matching entries whose indexed text or project name matches ``text``, for the admin."""
+    expression = match_expression(text)
+    if expression is None:
+        return Q(pk__in=[])
+    projects = Q(project__in=Project.objects.filter(name__icontains=text.strip()).values('pk'))
+    if connections[JournalEntry.objects.db].vendor != 'sqlite':
+        return icontains_filter(text) | projects
+    matches = RawSQL(
+        f'SELECT entry_id FROM {IDS_TABLE} WHERE rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+        (expression,),
+    )
+    return Q(pk__in=matches) | projects
+
+
+def rebuild_index(using='default'):
+    """Re-create the index tables and triggers and re-read every entry into the index.
+
+    Safe to run at any time; returns the number of entries indexed.
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for statement in TABLES_SQL:
+            cursor.execute(statement)
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'DELETE FROM {IDS_TABLE}')
+        cursor.execute(f'INSERT INTO {IDS_TABLE}(entry_id) SELECT id FROM {ENTRIES_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) '
+            f"SELECT ids.rowid, {', '.join('e.' + field for field in SEARCH_FIELDS)} "
+            f'FROM {IDS_TABLE} ids JOIN {ENTRIES_TABLE} e ON e.id = ids.entry_id'
+        )
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'CREATE TRIGGER {name} {body}')
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', '{RANK}')")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return JournalEntry.objects.using(using).count()
+
+
+def check_index(using='default'):
+    """Raise ``django.db.DatabaseError`` if the index disagrees with the entries
+    table or a trigger that keeps it current is missing."""
+    fields_differ = ' OR '.join(f'fts.{field} IS NOT e.{field}' for field in SEARCH_FIELDS)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [ENTRIES_TABLE]
+        )
+        missing = sorted(set(TRIGGERS) - {name for name, in cursor.fetchall()})
+        if missing:
+            raise DatabaseError(f"missing trigger(s) {', '.join(missing)}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+        cursor.execute(f"""SELECT
+            (SELECT COUNT(*) FROM {ENTRIES_TABLE} e
+             WHERE NOT EXISTS (SELECT 1 FROM {IDS_TABLE} ids WHERE ids.entry_id = e.id)),
+            (SELECT COUNT(*) FROM {IDS_TABLE} ids
+             WHERE NOT EXISTS (SELECT 1 FROM {ENTRIES_TABLE} e WHERE e.id = ids.entry_id)),
+            (SELECT COUNT(*) FROM {IDS_TABLE} ids
+             LEFT JOIN {FTS_TABLE} fts ON fts.rowid = ids.rowid
+             JOIN {ENTRIES_TABLE} e ON e.id = ids.entry_id
+             WHERE fts.rowid IS NULL OR {fields_differ}),
+            (SELECT COUNT(*) FROM {FTS_TABLE}) - (SELECT COUNT(*) FROM {IDS_TABLE})""")
+        unindexed, stale, changed, orphaned = cursor.fetchone()
+    if unindexed or stale or changed or orphaned:
+        raise DatabaseError(
+            f'{unindexed} entries not indexed, {stale} index rows for deleted entries, '
+            f'{changed} out of date, {orphaned} without an entry id'
+        )
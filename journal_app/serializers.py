@@ -1,6 +1,13 @@
+from datetime import date
+from decimal import Decimal
 from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
 from .models import JournalEntry, UploadedFile, Project
+from .signals import ledger_entries_added, ledger_entries_removed
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -58,9 +65,265 @@ class JournalEntrySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'project', 'project_name', 'user', 'title', 'description', 
             'entry_type', 'amount', 'date', 'account_name', 'reference_number',
-            'created_at', 'updated_at'
+            'source_file', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'source_file', 'created_at', 'updated_at']
+
+AMOUNT_QUANTUM = Decimal('0.01')
+
+def format_amount(value):
+    return '{:f}'.format(value.quantize(AMOUNT_QUANTUM))
+
+def format_datetime(value):
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def format_optional_str(value):
+    return None if value is None else str(value)
+
+class JournalEntryRowSerializer:
+    """Read-only fast path for listing journal entries.
+    
+    Renders rows from ``JournalEntry.objects.values(*VALUE_FIELDS)`` into
+    exactly the dicts JournalEntrySerializer produces for model instances
+    (same keys, order and value formatting), without per-field DRF machinery
+    or a per-row project lookup. Use it with ``rows()`` below.
+    
+    With ``fields`` (output names, see ``parse_fields``) only those keys are
+    rendered and only their columns selected; ``project_name`` is then null
+    rather than omitted for entries without a project.
+    """
+    VALUE_FIELDS = [
+        'id', 'project_id', 'project__name', 'user_id', 'title', 'description',
+        'entry_type', 'amount', 'date', 'account_name', 'reference_number',
+        'source_file_id', 'created_at', 'updated_at'
+    ]
+    # Output name -> (column, formatter or None) for ``?fields=`` projections.
+    PROJECTIONS = {
+        'id': ('id', str),
+        'project': ('project_id', None),
+        'project_name': ('project__name', None),
+        'user': ('user_id', None),
+        'title': ('title', None),
+        'description': ('description', None),
+        'entry_type': ('entry_type', None),
+        'amount': ('amount', format_amount),
+        'date': ('date', date.isoformat),
+        'account_name': ('account_name', None),
+        'reference_number': ('reference_number', None),
+        'source_file': ('source_file_id', format_optional_str),
+        'created_at': ('created_at', format_datetime),
+        'updated_at': ('updated_at', format_datetime),
+    }
+    # Selected whatever the projection: the keyset cursor is built from them.
+    ORDERING_FIELDS = ['date', 'created_at', 'id']
+    
+    def __init__(self, instance=None, many=True, fields=None, **kwargs):
+        self.instance = instance
+        self.fields = fields
+    
+    @classmethod
+    def rows(cls, queryset, fields=None):
+        if fields is None:
+            return queryset.values(*cls.VALUE_FIELDS)
+        columns = dict.fromkeys(cls.ORDERING_FIELDS)
+        columns.update(dict.fromkeys(cls.PROJECTIONS[name][0] for name in fields))
+        return queryset.values(*columns)
+    
+    @classmethod
+    def parse_fields(cls, value):
+        """Output names from a comma-separated ``?fields=``; raises ValueError for unknown ones."""
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in cls.PROJECTIONS]
+        if unknown or not fields:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown) or repr(value)}. "
+                             f"Choose from: {', '.join(cls.PROJECTIONS)}.")
+        return list(dict.fromkeys(fields))
+    
+    def to_representation(self, row):
+        if self.fields is not None:
+            return self.project(row)
+        data = {'id': str(row['id']), 'project': row['project_id']}
+        # JournalEntrySerializer omits project_name when there is no project.
+        if row['project_id'] is not None:
+            data['project_name'] = row['project__name']
+        data['user'] = row['user_id']
+        data['title'] = row['title']
+        data['description'] = row['description']
+        data['entry_type'] = row['entry_type']
+        data['amount'] = format_amount(row['amount'])
+        data['date'] = row['date'].isoformat()
+        data['account_name'] = row['account_name']
+        data['reference_number'] = row['reference_number']
+        data['source_file'] = format_optional_str(row['source_file_id'])
+        data['created_at'] = format_datetime(row['created_at'])
+        data['updated_at'] = format_datetime(row['updated_at'])
+        return data
+    
+    def project(self, row):
+        data = {}
+        for name in self.fields:
+            column, formatter = self.PROJECTIONS[name]
+            value = row[column]
+            data[name] = value if formatter is None or value is None else formatter(value)
+        return data
+    
+    @property
+    def data(self):
+        return [self.to_representation(row) for row in self.instance]
+
+def snapshot(entry):
+    """A detached copy of ``entry``'s field values for the ledger receivers.
+    
+    Cheaper than ``copy.copy``, which pickles the instance state.
+    """
+    clone = JournalEntry.__new__(JournalEntry)
+    clone.__dict__.update(entry.__dict__)
+    return clone
+
+class JournalEntryBulkSerializer:
+    """Validates and saves a list of journal entry payloads in a single pass.
+    
+    Scalar fields are checked with the same DRF fields JournalEntrySerializer
+    uses (so error messages match the single-entry endpoint), while ``project``
+    and ``user`` references are resolved with one query per model instead of
+    one per item. ``errors`` is a list of ``{'index': i, 'errors': {...}}``.
+    
+    With ``upsert=True``, items whose (project, reference_number) matches an
+    existing entry update that entry instead of creating a new one.
+    """
+    RELATED_FIELDS = {'project': Project, 'user': User}
+    LOOKUP_CHUNK_SIZE = 500
+    
+    def __init__(self, data, upsert=False):
+        self.initial_data = data
+        self.upsert = upsert
+        self.validated_data = []
+        self.item_errors = {}
+        fields = JournalEntrySerializer().fields
+        self.scalar_fields = {
+            name: field for name, field in fields.items()
+            if not field.read_only and name not in self.RELATED_FIELDS
+        }
+    
+    @property
+    def errors(self):
+        return [{'index': index, 'errors': self.item_errors[index]} for index in sorted(self.item_errors)]
+    
+    def add_error(self, index, field, messages):
+        self.item_errors.setdefault(index, {}).setdefault(field, []).extend(messages)
+    
+    def is_valid(self):
+        if not isinstance(self.initial_data, list):
+            self.item_errors = {None: {'non_field_errors': ['Expected a list of entries.']}}
+            return False
+        
+        references = {name: set() for name in self.RELATED_FIELDS}
+        for index, item in enumerate(self.initial_data):
+            self.validated_data.append(self.validate_item(index, item, references))
+        
+        existing = {
+            name: set(model.objects.filter(pk__in=references[name]).values_list('pk', flat=True))
+            for name, model in self.RELATED_FIELDS.items() if references[name]
+        }
+        seen_keys = set()
+        for index, attrs in enumerate(self.validated_data):
+            for name in self.RELATED_FIELDS:
+                pk = attrs.get(name + '_id')
+                if pk is not None and pk not in existing[name]:
+                    self.add_error(index, name, [f'Invalid pk "{pk}" - object does not exist.'])
+            key = self.upsert_key(attrs)
+            if key is not None:
+                if key in seen_keys:
+                    self.add_error(index, 'reference_number', ['Duplicate project/reference_number in request.'])
+                seen_keys.add(key)
+        
+        return not self.item_errors
+    
+    def validate_item(self, index, item, references):
+        attrs = {}
+        if not isinstance(item, dict):
+            self.add_error(index, 'non_field_errors', ['Expected an object.'])
+            return attrs
+        
+        for name, field in self.scalar_fields.items():
+            try:
+                attrs[name] = field.run_validation(item.get(name, empty))
+            except SkipField:
+                pass
+            except serializers.ValidationError as e:
+                self.add_error(index, name, e.detail)
+        
+        for name, model in self.RELATED_FIELDS.items():
+            value = item.get(name)
+            if value is None:
+                attrs[name + '_id'] = None
+                continue
+            try:
+                pk = model._meta.pk.to_python(value)
+            except (DjangoValidationError, TypeError, ValueError):
+                self.add_error(index, name, [f'Incorrect type. Expected pk value, received {type(value).__name__}.'])
+                continue
+            attrs[name + '_id'] = pk
+            references[name].add(pk)
+        return attrs
+    
+    def upsert_key(self, attrs):
+        if not self.upsert or not attrs.get('reference_number'):
+            return None
+        return attrs.get('project_id'), attrs['reference_number']
+    
+    def find_existing(self):
+        keys = {key for key in map(self.upsert_key, self.validated_data) if key is not None}
+        references = sorted({reference for _, reference in keys})
+        existing = {}
+        for start in range(0, len(references), self.LOOKUP_CHUNK_SIZE):
+            chunk = references[start:start + self.LOOKUP_CHUNK_SIZE]
+            for entry in JournalEntry.objects.filter(reference_number__in=chunk).order_by():
+                key = (entry.project_id, entry.reference_number)
+                if key in keys:
+                    existing[key] = entry
+        return existing
+    
+    def save(self):
+        """Write the validated entries; returns ``(created, updated)`` counts.
+        
+        Updated entries only write the columns whose values changed (plus
+        ``updated_at``), one UPDATE per distinct set of columns, so unchanged
+        text does not rewrite the search index or unrelated indexes.
+        """
+        from .file_processors import JournalEntryWriter, update_entries
+        
+        now = timezone.now()
+        writer = JournalEntryWriter()
+        updated, previous, by_columns = [], [], {}
+        with transaction.atomic():
+            existing = self.find_existing() if self.upsert else {}
+            for attrs in self.validated_data:
+                entry = existing.get(self.upsert_key(attrs))
+                if entry is None:
+                    writer.add(JournalEntry(**attrs))
+                    continue
+                previous.append(snapshot(entry))
+                changed = [name for name, value in attrs.items() if getattr(entry, name) != value]
+                for name in changed:
+                    setattr(entry, name, attrs[name])
+                fingerprint = entry.compute_fingerprint()
+                if fingerprint != entry.fingerprint:
+                    entry.fingerprint = fingerprint
+                    changed.append('fingerprint')
+                entry.updated_at = now
+                by_columns.setdefault(tuple(changed) + ('updated_at',), []).append(entry)
+                updated.append(entry)
+            writer.flush()
+            if updated:
+                for columns, entries in by_columns.items():
+                    update_entries(entries, columns)
+                ledger_entries_removed.send(sender=JournalEntry, entries=previous)
+                ledger_entries_added.send(sender=JournalEntry, entries=updated)
+        return writer.written, len(updated)
 
 class UploadedFileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .models import JournalEntry
+
+# Sent with ``entries=[JournalEntry, ...]`` whenever journal entries start or
+# stop counting towards the ledger. Unlike the model signals these also cover
+# bulk writes (imports), so denormalized data should listen here. Receivers
+# run inside the writing transaction where there is one.
+ledger_entries_added = Signal()
+ledger_entries_removed = Signal()
+# Sent with ``queryset=`` just before ``JournalEntry.objects...delete()``
+# deletes those entries (or update() rewrites their ledger fields), so receivers can aggregate them in SQL instead of
+# loading every row. There are deliberately no pre/post_delete receivers on
+# JournalEntry: any would stop Django deleting entries (including those
+# cascaded from a deleted project) with a single DELETE.
+ledger_entries_deleted = Signal()
+# ``JournalEntry.objects...update()`` (and so bulk_update()) of ledger fields
+# sends ledger_entries_deleted for the rows before the write, then this with
+# ``queryset=`` the same rows after it, so receivers can add them back.
+ledger_entries_updated = Signal()
+# Sent with ``queryset=`` just before ``JournalEntry.objects...update()``
+# rewrites fields that are not ledger fields, so caches can drop the pages
+# that show those entries.
+entries_updated = Signal()
+
+LEDGER_FIELDS = {'project', 'project_id', 'entry_type', 'amount', 'date', 'account_name'}
+
+
+@receiver(pre_save, sender=JournalEntry)
+def remember_previous_entry(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and not LEDGER_FIELDS & set(update_fields)):
+        instance._ledger_previous = None
+        return
+    instance._ledger_previous = JournalEntry.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=JournalEntry)
+def entry_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not LEDGER_FIELDS & set(update_fields)):
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is not None:
+        ledger_entries_removed.send(sender=JournalEntry, entries=[previous])
+    ledger_entries_added.send(sender=JournalEntry, entries=[instance])
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # The user's entries are then cascade-deleted without signals.
+    ledger_entries_deleted.send(sender=JournalEntry, queryset=JournalEntry.objects.filter(user=instance))
@@ -1,3 +1,1374 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+import hashlib
+import os
+import json
+import shutil
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .caching import CACHE_REQUESTS, get_versions, project_version
+from .db import bulk_mode
+from .events import BROKER, publish_file_status, publishing_file_status, stream_file_events
+from .exporters import EXPORT_COLUMNS
+from . import events, jobs, pdf_extraction
+from .file_processors import FileProcessor, JournalEntryWriter, ProcessingLogBuffer
+from .ledger import project_totals_mismatches, rollup_mismatches
+from .line_parsers import LineParser
+from .parsing import DateOrderConflict, ParsingContext, normalize_amount
+from .profiling import ImportProfile
+from .models import JournalEntry, LedgerRollup, ProcessingLog, Project, UploadedFile
+from .pagination import JournalEntryPagination, paginate_keyset
+from .search import IDS_TABLE, check_index, rebuild_index, search_filter
+from .serializers import JournalEntrySerializer
+
+
+class ImportTestCase(TestCase):
+    """Runs small uploaded fixtures through FileProcessor in a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='journal-test-')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.project = Project.objects.create(name='Imports')
+
+    def upload(self, name, content, file_type='csv', **fields):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        return UploadedFile.objects.create(
+            file=SimpleUploadedFile(name, content), original_filename=name,
+            file_type=file_type, file_size=len(content), **fields
+        )
+
+    def import_file(self, name, content, file_type='csv', **processor_options):
+        uploaded_file = self.upload(name, content, file_type)
+        FileProcessor(uploaded_file, project=self.project, **processor_options).process()
+        uploaded_file.refresh_from_db()
+        return uploaded_file
+
+    def log_messages(self, uploaded_file, level=None):
+        logs = uploaded_file.logs.all()
+        if level is not None:
+            logs = logs.filter(level=level)
+        return [log.message for log in logs]
+
+    def entry_inserts(self, queries):
+        table = JournalEntry._meta.db_table
+        return [query for query in queries if query['sql'].startswith(f'INSERT INTO "{table}"')]
+
+
+class ProjectAPIQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user('owner')
+        self.member = User.objects.create_user('member')
+
+    def create_projects(self, count):
+        projects = Project.objects.bulk_create(
+            Project(name=f'Project {i}', owner=self.owner) for i in range(count)
+        )
+        Project.team_members.through.objects.bulk_create(
+            Project.team_members.through(project=project, user=self.member) for project in projects
+        )
+        JournalEntry.objects.create(
+            project=projects[0], title='Opening balance', entry_type='debit',
+            amount=Decimal('10.00'), date='2024-01-01', account_name='Cash'
+        )
+        return projects
+
+    def assert_list_queries(self, count):
+        self.create_projects(count)
+        # One query for projects joined to their owner, one for team members.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_projects'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), count)
+
+    def test_list_one_project(self):
+        self.assert_list_queries(1)
+
+    def test_list_100_projects(self):
+        self.assert_list_queries(100)
+
+    def test_list_1000_projects(self):
+        self.assert_list_queries(1000)
+
+    def test_detail(self):
+        project = self.create_projects(1)[0]
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_project_detail', args=[project.id]))
+        data = response.json()
+        self.assertEqual(data['total_entries'], 1)
+        self.assertEqual(data['total_debits'], 10.0)
+        self.assertEqual(data['team_members'][0]['username'], 'member')
+
+    def test_totals_of_a_project_without_entries_render_as_zero(self):
+        project = Project.objects.create(name='Empty')
+        body = self.client.get(reverse('api_project_detail', args=[project.id])).content.decode()
+        for field in ('total_debits', 'total_credits', 'net_amount'):
+            self.assertIn(f'"{field}":0,', body)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Ledger')
+        # Few distinct dates so that pages have to break ties on created_at/id.
+        for i in range(25):
+            JournalEntry.objects.create(
+                project=self.project, title=f'Entry {i}', entry_type='credit',
+                amount=Decimal('1.00'), date=f'2024-01-0{i % 3 + 1}', account_name='Cash'
+            )
+        self.expected = [
+            entry.id for entry in JournalEntry.objects.order_by(*JournalEntryPagination.ordering)
+        ]
+
+    def test_pages_forward_and_back(self):
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(JournalEntry.objects.all(), JournalEntryPagination.ordering, 10, cursor)
+            seen.append([entry.id for entry in page])
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual([entry for ids in seen for entry in ids], self.expected)
+
+        previous = paginate_keyset(
+            JournalEntry.objects.all(), JournalEntryPagination.ordering, 10, page.previous_cursor
+        )
+        self.assertEqual([entry.id for entry in previous], seen[-2])
+
+    def test_api_links(self):
+        response = self.client.get(reverse('api_project_entries', args=[self.project.id]), {'page_size': 20})
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([entry['id'] for entry in data['results']], [str(pk) for pk in self.expected[20:]])
+        self.assertIsNone(data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('api_entries'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_well_formed_cursor_with_bad_values(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        cursors = [
+            cursor({'p': ['notadate', 'x', 'y'], 'r': 0}),
+            cursor({'p': [], 'r': 0}),
+            cursor({'p': ['2024-01-01'], 'r': 0}),
+            cursor({'p': ['2024-01-01', None, str(self.expected[0])], 'r': 0}),
+            cursor({'p': 'abc', 'r': 1}),
+            cursor([1, 2]),
+        ]
+        for value in cursors:
+            self.assertEqual(self.client.get(reverse('api_entries'), {'cursor': value}).status_code, 404, value)
+            self.assertEqual(self.client.get(reverse('entry_list'), {'cursor': value}).status_code, 404, value)
+        # Search pages are ordered by rank, which is not a model field.
+        response = self.client.get(reverse('api_entries'), {'q': 'entry', 'cursor': cursor({'p': ['x', 'y'], 'r': 0})})
+        self.assertEqual(response.status_code, 404)
+
+
+class JournalEntryRowSerializerTests(TestCase):
+    def test_listing_matches_model_serializer(self):
+        user = User.objects.create_user('clerk')
+        project = Project.objects.create(name='Ledger ü')
+        JournalEntry.objects.create(
+            project=project, user=user, title='Sale', description='Invoice 7', entry_type='credit',
+            amount=Decimal('1234.5'), date='2024-02-29', account_name='Revenue', reference_number='INV-7'
+        )
+        JournalEntry.objects.create(
+            title='Unassigned', entry_type='debit', amount=Decimal('0.10'), date='2024-03-01', account_name='Cash'
+        )
+
+        response = APIClient().get(reverse('api_entries'))
+        entries = JournalEntry.objects.order_by(*JournalEntryPagination.ordering)
+        expected = JSONRenderer().render({
+            'next': None, 'previous': None, 'results': JournalEntrySerializer(entries, many=True).data
+        })
+        self.assertEqual(response.content, expected)
+
+
+class BulkEntriesAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.project = Project.objects.create(name='Ledger')
+
+    def entry(self, reference, amount='10.00', **overrides):
+        data = {
+            'project': str(self.project.id), 'title': f'Posting {reference}', 'entry_type': 'debit',
+            'amount': amount, 'date': '2024-05-01', 'account_name': 'Cash', 'reference_number': reference,
+        }
+        data.update(overrides)
+        return data
+
+    def test_create_then_upsert(self):
+        url = reverse('api_entries_bulk')
+        response = self.client.post(url, [self.entry('A'), self.entry('B')], format='json')
+        self.assertEqual(response.json(), {'created': 2, 'updated': 0, 'errors': []})
+
+        body = '\n'.join(json.dumps(item) for item in [self.entry('A', '25.00'), self.entry('C')])
+        response = self.client.post(f'{url}?upsert=true', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1, 'errors': []})
+
+        self.assertEqual(JournalEntry.objects.get(reference_number='A').amount, Decimal('25.00'))
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.entry_count, self.project.debit_total), (3, Decimal('45.00')))
+
+    def test_invalid_items_reject_the_whole_request(self):
+        response = self.client.post(
+            reverse('api_entries_bulk'),
+            [self.entry('A'), self.entry('B', amount='1.234'), self.entry('C', project=str(uuid.uuid4()))],
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2])
+        self.assertIn('amount', response.json()['errors'][0]['errors'])
+        self.assertFalse(JournalEntry.objects.exists())
+
+    def test_upsert_in_another_project_and_moves_keep_both_totals(self):
+        other = Project.objects.create(name='Other')
+        url = reverse('api_entries_bulk')
+        self.client.post(url, [self.entry('A'), self.entry('B', '5.00', entry_type='credit')], format='json')
+        # The upsert key is (project, reference_number): the same reference
+        # in another project is a new entry there.
+        response = self.client.post(f'{url}?upsert=true', [
+            self.entry('A', '7.00', project=str(other.id), account_name='Bank'),
+            self.entry('B', '6.00', entry_type='credit'),
+        ], format='json')
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1, 'errors': []})
+
+        moved = JournalEntry.objects.get(project=self.project, reference_number='A')
+        moved.project = other
+        moved.save()
+
+        totals = {
+            project.name: (project.entry_count, project.debit_total, project.credit_total)
+            for project in Project.objects.all()
+        }
+        self.assertEqual(totals, {
+            'Ledger': (1, Decimal('0'), Decimal('6.00')),
+            'Other': (2, Decimal('17.00'), Decimal('0')),
+        })
+        self.assertEqual(list(project_totals_mismatches()), [])
+        self.assertEqual(list(rollup_mismatches()), [])
+
+    def test_upsert_writes_only_changed_columns(self):
+        url = reverse('api_entries_bulk')
+        self.client.post(url, [self.entry('A'), self.entry('B'), self.entry('C')], format='json')
+        before = dict(JournalEntry.objects.values_list('reference_number', 'updated_at'))
+        table = JournalEntry._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'{url}?upsert=true', [
+                self.entry('A'), self.entry('B', '12.00'), self.entry('C', '12.00', title='Renamed'),
+            ], format='json')
+        self.assertEqual(response.json(), {'created': 0, 'updated': 3, 'errors': []})
+        updates = sorted(
+            query['sql'].split(' SET ')[1].split(' WHERE ')[0]
+            for query in queries.captured_queries if f'UPDATE "{table}"' in query['sql']
+        )
+        self.assertEqual(updates, [
+            '"amount" = %s, "fingerprint" = %s, "updated_at" = %s',
+            '"title" = %s, "amount" = %s, "fingerprint" = %s, "updated_at" = %s',
+            '"updated_at" = %s',
+        ])
+        after = {entry.reference_number: entry for entry in JournalEntry.objects.all()}
+        self.assertTrue(all(after[reference].updated_at > before[reference] for reference in before))
+        self.assertEqual((after['C'].title, after['C'].amount), ('Renamed', Decimal('12.00')))
+        self.assertEqual(after['B'].fingerprint, after['B'].compute_fingerprint())
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.debit_total, Decimal('34.00'))
+        self.assertEqual(list(rollup_mismatches()), [])
+
+
+class LedgerRollupTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name='Ledger')
+
+    def entry(self, account, entry_type, amount, date):
+        return JournalEntry(
+            project=self.project, title=f'{account} {date}', entry_type=entry_type,
+            amount=Decimal(amount), date=date, account_name=account,
+        )
+
+    def test_rollups_follow_writes(self):
+        writer = JournalEntryWriter()
+        writer.add(self.entry('Cash', 'debit', '100.00', '2024-01-05'))
+        writer.add(self.entry('Cash', 'debit', '50.00', '2024-01-20'))
+        writer.add(self.entry('Revenue', 'credit', '150.00', '2024-01-20'))
+        writer.flush()
+        moved = self.entry('Cash', 'credit', '30.00', '2024-02-01')
+        moved.save()
+        moved.date = '2024-03-01'
+        moved.amount = Decimal('40.00')
+        moved.save()
+        JournalEntry.objects.filter(account_name='Revenue').first().delete()
+
+        self.assertEqual(list(rollup_mismatches()), [])
+        response = self.client.get(reverse('api_project_trial_balance', args=[self.project.id]))
+        self.assertEqual(response.json()['accounts'], [
+            {'account_name': 'Cash', 'entries': 3, 'debits': '150.00', 'credits': '40.00', 'balance': '110.00'},
+        ])
+        response = self.client.get(
+            reverse('api_project_monthly_totals', args=[self.project.id]), {'date_from': '2024-02-15'}
+        )
+        self.assertEqual(response.json()['months'], [
+            {'month': '2024-03', 'entries': 1, 'debits': '0.00', 'credits': '40.00', 'net': '-40.00'},
+        ])
+
+    def test_rollups_follow_writes_without_upsert_support(self):
+        # Backends without INSERT ... ON CONFLICT update the rollups key by key.
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.test_rollups_follow_writes()
+
+    def test_invalid_dates_are_rejected(self):
+        for value in ('2024-13-01', '2024-02-30', 'soon'):
+            response = self.client.get(
+                reverse('api_project_trial_balance', args=[self.project.id]), {'date_to': value}
+            )
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('date_to', response.json())
+
+
+class LedgerDeleteTests(TestCase):
+    ENTRIES = 200
+
+    def setUp(self):
+        self.user = User.objects.create_user('ledger')
+        self.doomed = Project.objects.create(name='Doomed')
+        self.kept = Project.objects.create(name='Kept')
+        writer = JournalEntryWriter()
+        for project in (self.doomed, self.kept):
+            for i in range(self.ENTRIES):
+                writer.add(JournalEntry(
+                    project=project, user=self.user if i % 2 else None, title=f'Entry {i}',
+                    entry_type='debit' if i % 3 else 'credit', amount=Decimal(i + 1),
+                    date=datetime.date(2024, 1 + i % 4, 1 + i % 28), account_name=f'Account {i % 5}',
+                ))
+        writer.flush()
+
+    def assertLedgerConsistent(self):
+        self.assertEqual(list(project_totals_mismatches()), [])
+        self.assertEqual(list(rollup_mismatches()), [])
+
+    def assertBoundedDelete(self, delete, limit):
+        with CaptureQueriesContext(connection) as queries:
+            delete()
+        self.assertLessEqual(len(queries), limit, [query['sql'] for query in queries])
+
+    def test_project_delete_cascades_without_per_entry_queries(self):
+        self.assertBoundedDelete(self.doomed.delete, 15)
+        self.assertFalse(JournalEntry.objects.filter(project_id=self.doomed.id).exists())
+        self.assertEqual(Project.objects.get(pk=self.kept.pk).entry_count, self.ENTRIES)
+        self.assertLedgerConsistent()
+
+    def test_queryset_delete_updates_totals_per_project_and_rollup(self):
+        entries = JournalEntry.objects.filter(account_name__in=['Account 0', 'Account 1'])
+        # One update per rollup (2 projects x 2 accounts x 4 months x 2 types)
+        # and a single cleanup of the emptied ones.
+        self.assertBoundedDelete(entries.delete, 32 + 15)
+        self.assertFalse(entries.exists())
+        self.assertEqual(Project.objects.get(pk=self.kept.pk).entry_count, self.ENTRIES * 3 // 5)
+        self.assertLedgerConsistent()
+
+    def test_instance_and_user_deletes_keep_totals(self):
+        JournalEntry.objects.filter(project=self.kept, user=None).first().delete()
+        self.user.delete()
+        self.assertEqual(Project.objects.get(pk=self.kept.pk).entry_count, self.ENTRIES // 2 - 1)
+        self.assertLedgerConsistent()
+
+    def test_queryset_update_of_ledger_fields_keeps_totals(self):
+        # The filter matches none of the rows once their amount changes.
+        entries = JournalEntry.objects.filter(project=self.doomed, amount__lte=10)
+        self.assertEqual(entries.update(amount=Decimal('1000'), date=datetime.date(2023, 12, 31)), 10)
+        JournalEntry.objects.filter(account_name='Account 4').update(project=self.kept)
+        self.assertEqual(Project.objects.get(pk=self.doomed.pk).entry_count, self.ENTRIES * 4 // 5)
+        self.assertLedgerConsistent()
+
+    def test_bulk_update_of_ledger_fields_keeps_totals_and_cache(self):
+        versions = get_versions([project_version(self.kept.pk)])
+        entries = list(JournalEntry.objects.filter(project=self.kept)[:50])
+        for entry in entries:
+            entry.entry_type = 'credit' if entry.entry_type == 'debit' else 'debit'
+        JournalEntry.objects.bulk_update(entries, ['entry_type'], batch_size=20)
+        self.assertNotEqual(get_versions([project_version(self.kept.pk)]), versions)
+        self.assertLedgerConsistent()
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(name='Export')
+        for day, amount in [(5, '10.00'), (15, '20.50'), (25, '30.25')]:
+            JournalEntry.objects.create(
+                project=self.project, title=f'Entry {day}', entry_type='debit', amount=Decimal(amount),
+                date=datetime.date(2024, 1, day), account_name='Cash', reference_number=f'REF-{day}',
+            )
+
+    def export(self, **params):
+        response = self.client.get(reverse('api_entries_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        lines = self.export(format='csv').decode().splitlines()
+        self.assertEqual(lines[0].split(','), [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual([line.split(',')[7] for line in lines[1:]], ['10.00', '20.50', '30.25'])
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in self.export(format='jsonl').decode().splitlines()]
+        self.assertEqual([row['reference_number'] for row in rows], ['REF-5', 'REF-15', 'REF-25'])
+        self.assertEqual(rows[0]['project'], str(self.project.id))
+
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(BytesIO(self.export(format='xlsx')), read_only=True).active
+        rows = list(sheet.values)
+        self.assertEqual(list(rows[0]), [name for name, _ in EXPORT_COLUMNS])
+        self.assertEqual([row[10] for row in rows[1:]], ['REF-5', 'REF-15', 'REF-25'])
+
+    def test_date_filter(self):
+        rows = [
+            json.loads(line) for line in
+            self.export(format='jsonl', date_from='2024-01-10', date_to='2024-01-20').decode().splitlines()
+        ]
+        self.assertEqual([row['date'] for row in rows], ['2024-01-15'])
+
+    def test_invalid_dates_are_rejected(self):
+        for value in ('2024-02-30', '2024-1-1x', 'soon'):
+            response = self.client.get(reverse('api_entries_export'), {'date_from': value})
+            self.assertEqual(response.status_code, 400, value)
+            with self.assertRaises(CommandError):
+                call_command('export_entries', date_from=value, stdout=StringIO())
+
+    def test_xlsx_row_limit(self):
+        with mock.patch('journal_app.exporters.XLSX_MAX_ROWS', 3):
+            response = self.client.get(reverse('api_entries_export'), {'format': 'xlsx'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('limited to 2 entries', response.json()['error'])
+            self.assertEqual(self.client.get(reverse('api_entries_export'), {'format': 'csv'}).status_code, 200)
+            with self.assertRaises(CommandError):
+                call_command('export_entries', format='xlsx', stdout=StringIO())
+
+
+class ImportQueueTests(ImportTestCase):
+    CSV = 'date,amount,account,type\n2024-01-05,10.00,Cash,debit\n2024-01-06,20.00,Sales,credit\n'
+
+    def backdate(self, uploaded_file, seconds):
+        claimed_at = timezone.now() - datetime.timedelta(seconds=seconds)
+        UploadedFile.objects.filter(pk=uploaded_file.pk).update(claimed_at=claimed_at)
+
+    def test_claims_oldest_pending_file_once(self):
+        first = self.upload('first.csv', self.CSV)
+        second = self.upload('second.csv', self.CSV)
+        self.upload('done.csv', self.CSV, status='completed')
+
+        claimed = jobs.claim_next()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertIsNotNone(claimed.claimed_at)
+        self.assertIsNone(jobs.claim(first.pk))
+        self.assertEqual(jobs.claim_next().pk, second.pk)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_stale_job_is_requeued_without_its_partial_entries(self):
+        uploaded_file = jobs.claim(self.upload('stale.csv', self.CSV).pk)
+        # The worker died after committing one batch.
+        writer = JournalEntryWriter()
+        writer.add(JournalEntry(
+            project=self.project, source_file=uploaded_file, title='Partial', entry_type='debit',
+            amount=Decimal('10.00'), date=datetime.date(2024, 1, 5), account_name='Cash',
+        ))
+        writer.flush()
+        self.backdate(uploaded_file, 120)
+
+        self.assertEqual(jobs.requeue_stale(max_age=60), 1)
+        uploaded_file.refresh_from_db()
+        self.assertEqual((uploaded_file.status, uploaded_file.claimed_at), ('pending', None))
+        self.assertFalse(JournalEntry.objects.filter(source_file=uploaded_file).exists())
+        self.assertEqual(Project.objects.get(pk=self.project.pk).entry_count, 0)
+        self.assertIn('removed 1 entries', self.log_messages(uploaded_file, 'warning')[0])
+
+        claimed = jobs.claim_next()
+        FileProcessor(claimed, project=self.project).process()
+        self.assertEqual(JournalEntry.objects.filter(source_file=uploaded_file).count(), 2)
+        self.assertEqual(list(project_totals_mismatches()), [])
+
+    def test_progress_keeps_a_long_job_claimed(self):
+        uploaded_file = jobs.claim(self.upload('slow.csv', self.CSV).pk)
+        self.backdate(uploaded_file, 120)
+        FileProcessor(uploaded_file, project=self.project).report_progress(1)
+        self.assertEqual(jobs.requeue_stale(max_age=60), 0)
+        uploaded_file.refresh_from_db()
+        self.assertEqual(uploaded_file.status, 'processing')
+
+
+class ProcessFilesCommandTests(ImportTestCase):
+    CSV = ImportQueueTests.CSV
+
+    def call(self, **options):
+        out = StringIO()
+        call_command('process_files', stdout=out, **options)
+        return out.getvalue()
+
+    def test_limit_processes_oldest_files_in_process(self):
+        uploads = [self.upload(f'{n}.csv', self.CSV) for n in range(3)]
+        with mock.patch('multiprocessing.get_context') as get_context:
+            output = self.call(limit=2, verbosity=0)
+        get_context.assert_not_called()
+        self.assertIn('Processed 2 file(s) (0 failed), 4 entries', output)
+        statuses = [UploadedFile.objects.get(pk=upload.pk).status for upload in uploads]
+        self.assertEqual(statuses, ['completed', 'completed', 'pending'])
+
+    def test_file_id_processes_only_that_pending_file(self):
+        first = self.upload('first.csv', self.CSV)
+        chosen = self.upload('chosen.csv', self.CSV)
+        output = self.call(file_id=str(chosen.pk))
+        self.assertIn('chosen.csv: completed, 2 entries', output)
+        self.assertEqual(UploadedFile.objects.get(pk=first.pk).status, 'pending')
+
+        with self.assertRaisesMessage(CommandError, 'is not pending'):
+            self.call(file_id=str(chosen.pk))
+        with self.assertRaisesMessage(CommandError, 'is not a file id'):
+            self.call(file_id='not-a-uuid')
+        with self.assertRaisesMessage(CommandError, 'with --file-id'):
+            self.call(cprofile='profile.out')
+
+
+class BulkModeTests(TransactionTestCase):
+    # bulk_mode does nothing inside a transaction, so not a TestCase.
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_applies_and_restores_pragmas(self):
+        before = self.pragma('cache_size'), self.pragma('synchronous')
+        with bulk_mode(JournalEntry):
+            # The default keeps durability and only grows the page cache.
+            self.assertEqual((self.pragma('cache_size'), self.pragma('synchronous')), (-256000, before[1]))
+        self.assertEqual((self.pragma('cache_size'), self.pragma('synchronous')), before)
+
+    @override_settings(JOURNAL_SQLITE_BULK_PRAGMAS={'synchronous': 'off'})
+    def test_opt_in_pragmas_are_restored_after_errors(self):
+        before = self.pragma('synchronous')
+        with self.assertRaises(ZeroDivisionError):
+            with bulk_mode(JournalEntry):
+                self.assertEqual(self.pragma('synchronous'), 0)
+                1 / 0
+        self.assertEqual(self.pragma('synchronous'), before)
+
+    def test_skipped_inside_a_transaction(self):
+        before = self.pragma('cache_size')
+        with transaction.atomic(), bulk_mode(JournalEntry):
+            self.assertEqual(self.pragma('cache_size'), before)
+
+
+class LineParserTests(TestCase):
+    def test_detects_report_layout_and_skips_headers(self):
+        parser = LineParser()
+        lines = [
+            'Date Journal_ID Account Description Amount DC Posted_By',
+            '2024-04-12 JE100000 Accounts Receivable Payment received 9,507,635.92 Debit erina',
+            '2024-08-02 JE100001 Revenue Year-end adjustment 4,597,896.43 Credit asmith',
+            '2024-13-45 JE100002 Revenue Bad date 1.00 Credit asmith',
+            'Page 1 of 23',
+        ]
+        parsed = list(parser.parse(lines))
+        self.assertEqual(parser.format.name, 'journal_report')
+        self.assertEqual((parser.lines, parser.skipped), (5, 2))
+        self.assertEqual(parsed[0][1], {
+            'date': datetime.date(2024, 4, 12), 'reference_number': 'JE100000',
+            'account_name': 'Accounts Receivable', 'title': 'Payment received',
+            'amount': Decimal('9507635.92'), 'entry_type': 'debit',
+        })
+        self.assertEqual(parsed[1][1]['entry_type'], 'credit')
+        self.assertIsNone(parsed[2][1])
+
+    def test_pipe_layout(self):
+        parser = LineParser()
+        parsed = [fields for _, fields in parser.parse(['2023-12-01 | Sales Revenue | -1000.00 | Credit'])]
+        self.assertEqual(parser.format.name, 'pipe')
+        self.assertEqual(parsed, [{
+            'date': datetime.date(2023, 12, 1), 'title': 'Sales Revenue', 'amount': Decimal('-1000.00'),
+            'account_name': 'General', 'entry_type': 'credit',
+        }])
+
+    def test_pipe_entry_types_fall_back_to_first_letter(self):
+        unrecognized = []
+        parser = LineParser(on_unrecognized_type=lambda *args: unrecognized.append(args))
+        lines = [
+            '2023-12-01 | Sale | 10.00 | DR',
+            '2023-12-02 | Refund | 5.00 | Refund',
+            '2023-12-03 | Deposit | 7.00 | Deposit',
+            '2023-12-04 | Unknown | 1.00 |',
+        ]
+        types = [fields['entry_type'] for _, fields in parser.parse(lines)]
+        self.assertEqual(types, ['debit', 'credit', 'debit', 'credit'])
+        self.assertEqual([args[1:] for args in unrecognized], [
+            ('Refund', 'credit'), ('Deposit', 'debit'), ('', 'credit'),
+        ])
+
+    def test_report_accounts_are_read_from_column_casing(self):
+        parser = LineParser()
+        lines = [
+            '2024-04-12 JE1 Prepaid Office Rent Invoice 42 settled 1,000.00 Credit erina',
+            '2024-04-13 JE2 Accounts Payable Refund 10.00 Debit erina',
+            '2024-04-14 JE3 Cash Payment from Acme Corp 25.50 Debit kbudi',
+            '2024-04-15 JE4 Inventory Inventory adjustment 3.00 Credit kbudi',
+        ]
+        parsed = [(fields['account_name'], fields['title']) for _, fields in parser.parse(lines)]
+        self.assertEqual(parser.format.name, 'journal_report')
+        self.assertEqual(parsed, [
+            ('Prepaid Office Rent', 'Invoice 42 settled'),
+            ('Accounts Payable', 'Refund'),
+            ('Cash', 'Payment from Acme Corp'),
+            ('Inventory', 'Inventory adjustment'),
+        ])
+
+
+class TextImportTests(ImportTestCase):
+    def test_unrecognized_entry_types_are_imported_and_logged(self):
+        content = (
+            '2023-12-01 | Sale | 10.00 | Debit\n'
+            '2023-12-02 | Refund | 5.00 | Refund\n'
+            '2023-12-03 | Refund | 6.00 | Reversal\n'
+        )
+        uploaded_file = self.import_file('entries.txt', content, file_type='txt')
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual(
+            list(uploaded_file.journal_entries.order_by('date').values_list('entry_type', flat=True)),
+            ['debit', 'credit', 'credit'],
+        )
+        warnings = sorted(message for message in self.log_messages(uploaded_file, 'warning') if 'entry type' in message)
+        self.assertEqual(warnings, [
+            "Unrecognized entry type 'Refund' in line '2023-12-02 | Refund | 5.00 | Refund'; imported as credit",
+            "Unrecognized entry type 'Reversal' in line '2023-12-03 | Refund | 6.00 | Reversal'; imported as credit",
+        ])
+
+
+class PDFImportTests(ImportTestCase):
+    SAMPLE = os.path.join(settings.BASE_DIR, 'media', 'uploads', 'journal_entries_sample_1000.pdf')
+
+    def sample_pages(self, **options):
+        return [(number, text) for number, text, _ in pdf_extraction.iter_pdf_pages(self.SAMPLE, **options)]
+
+    def test_pages_are_extracted_in_page_order(self):
+        pages = self.sample_pages(workers=1)
+        self.assertEqual([number for number, _ in pages], list(range(1, 24)))
+        self.assertTrue(pages[0][1].startswith('Date Journal_ID Account Description Amount DC Posted_By'))
+
+    def test_pool_is_skipped_for_small_documents_and_single_cpus(self):
+        with mock.patch.object(pdf_extraction, 'get_pool') as get_pool:
+            with mock.patch.object(pdf_extraction, 'available_cpus', return_value=4):
+                self.sample_pages(pages_per_task=4)
+            with mock.patch.object(pdf_extraction, 'available_cpus', return_value=1):
+                self.sample_pages(workers=4, pages_per_task=4, min_pool_pages=1)
+        get_pool.assert_not_called()
+
+    def test_pool_extracts_the_same_pages_and_is_shared(self):
+        self.addCleanup(pdf_extraction.shutdown_pool)
+        with mock.patch.object(pdf_extraction, 'available_cpus', return_value=2):
+            pooled = self.sample_pages(pages_per_task=4, min_pool_pages=1)
+            pool = pdf_extraction.get_pool(2)
+            self.assertEqual(self.sample_pages(pages_per_task=5, min_pool_pages=1), pooled)
+            self.assertIs(pdf_extraction.get_pool(2), pool)
+        self.assertEqual(pooled, self.sample_pages(workers=1))
+
+    def test_import_records_page_timings(self):
+        with open(self.SAMPLE, 'rb') as sample:
+            uploaded_file = self.upload('sample.pdf', sample.read(), file_type='pdf')
+        processor = FileProcessor(uploaded_file, project=self.project)
+        processor.process()
+        uploaded_file.refresh_from_db()
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual([number for number, _ in processor.page_timings], list(range(1, 24)))
+        self.assertEqual(uploaded_file.processed_entries_count, uploaded_file.journal_entries.count())
+        self.assertGreater(uploaded_file.processed_entries_count, 0)
+        self.assertTrue(any(
+            message.startswith(f'Extracted {processor.line_parser.lines} lines from 23 PDF pages')
+            for message in self.log_messages(uploaded_file)
+        ))
+
+
+class ParsingContextTests(TestCase):
+    def test_normalize_amount(self):
+        cases = {
+            '1,234.56': Decimal('1234.56'), '1.234,56': Decimal('1234.56'), '$ 1 234.56': Decimal('1234.56'),
+            '(1,234.56)': Decimal('-1234.56'), '1234.56-': Decimal('-1234.56'), '12,5': Decimal('12.5'),
+            '1,234': Decimal('1234'), 'n/a': None, '': None,
+        }
+        for text, expected in cases.items():
+            self.assertEqual(normalize_amount(text), expected, text)
+
+    def test_infers_date_format_once_and_memoises(self):
+        context = ParsingContext()
+        self.assertEqual(context.infer_date_format(['03/04/2024', '13/04/2024']), '%d/%m/%Y')
+        dates = [context.parse_date(text) for text in ['03/04/2024'] * 3 + ['2024-04-05']]
+        self.assertEqual(dates, [datetime.date(2024, 4, 3)] * 3 + [datetime.date(2024, 4, 5)])
+        self.assertEqual(context._parse_date.cache_info().hits, 2)
+
+        context = ParsingContext()
+        self.assertEqual(context.infer_date_format(['04/13/2024', '04/03/2024']), '%m/%d/%Y')
+
+    def test_ambiguous_dates_read_month_first_and_conflicts_raise(self):
+        context = ParsingContext()
+        self.assertEqual(context.infer_date_format(['03/04/2024', '05/06/2024']), '%m/%d/%Y')
+        self.assertEqual(context.parse_date('03-04-2024'), datetime.date(2024, 3, 4))
+        with self.assertRaises(DateOrderConflict):
+            context.parse_date('13/04/2024')
+
+        # No inferred format: the first date needing an order fixes it.
+        context = ParsingContext()
+        self.assertEqual(context.parse_date('13.04.2024'), datetime.date(2024, 4, 13))
+        self.assertEqual(context.parse_date('03/04/2024'), datetime.date(2024, 4, 3))
+
+
+class JournalEntryWriterTests(ImportTestCase):
+    CSV = ImportQueueTests.CSV
+
+    def test_flushes_every_batch_size_entries(self):
+        flushed = []
+        writer = JournalEntryWriter(batch_size=2, on_flush=flushed.append)
+        for day in range(1, 6):
+            writer.add(JournalEntry(
+                project=self.project, title=f'Entry {day}', entry_type='debit',
+                amount=Decimal('1.00'), date=datetime.date(2024, 1, day), account_name='Cash',
+            ))
+        self.assertEqual(flushed, [2, 4])
+        self.assertEqual(JournalEntry.objects.count(), 4)
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(writer.flush(), 0)
+        self.assertEqual((flushed, writer.written), ([2, 4, 5], 5))
+        self.assertEqual(Project.objects.get(pk=self.project.pk).entry_count, 5)
+
+    def test_import_writes_one_insert_per_batch(self):
+        rows = ''.join(f'2024-01-{day:02d},Entry {day},{day}.00\n' for day in range(1, 6))
+        with CaptureQueriesContext(connection) as queries:
+            uploaded_file = self.import_file('batches.csv', 'date,title,amount\n' + rows, batch_size=2)
+        self.assertEqual(uploaded_file.processed_entries_count, 5)
+        self.assertEqual(len(self.entry_inserts(queries.captured_queries)), 3)
+
+    @override_settings(JOURNAL_IMPORT_SKIP_DUPLICATE_ROWS=True)
+    def test_skip_duplicates_drops_rows_imported_earlier(self):
+        self.assertEqual(self.import_file('first.csv', self.CSV).processed_entries_count, 2)
+        again = self.import_file('again.csv', self.CSV + '2024-01-07,30.00,Cash,debit\n')
+        self.assertEqual(again.processed_entries_count, 1)
+        self.assertIn('Skipped 2 rows that were already imported.', self.log_messages(again))
+        self.assertEqual(JournalEntry.objects.filter(project=self.project).count(), 3)
+
+    @override_settings(JOURNAL_IMPORT_SKIP_DUPLICATE_ROWS=True)
+    def test_skip_duplicates_keeps_repeats_within_a_file_and_other_projects(self):
+        repeated = self.CSV + '2024-01-05,10.00,Cash,debit\n'
+        self.assertEqual(self.import_file('repeated.csv', repeated, batch_size=1).processed_entries_count, 3)
+        self.project = Project.objects.create(name='Other')
+        self.assertEqual(self.import_file('other.csv', self.CSV).processed_entries_count, 2)
+
+    def test_duplicates_are_imported_again_by_default(self):
+        self.import_file('first.csv', self.CSV)
+        self.assertEqual(self.import_file('again.csv', self.CSV).processed_entries_count, 2)
+
+
+class FrameImportTests(ImportTestCase):
+    def entries(self):
+        return list(JournalEntry.objects.filter(project=self.project).order_by('date').values_list(
+            'date', 'title', 'amount', 'account_name', 'entry_type', 'reference_number'
+        ))
+
+    def test_maps_columns_and_entry_types(self):
+        content = (
+            'Date,Description,Amount,Account,Type,Ref\n'
+            '2024-01-05,Invoice,"(1,234.50)",Cash,Debit,INV-1\n'
+            '2024-01-06,Refund,20,Sales,cr,\n'
+            '2024-01-07,,5.5,,D,INV-2\n'
+        )
+        uploaded_file = self.import_file('mapped.csv', content)
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual(self.entries(), [
+            (datetime.date(2024, 1, 5), 'Invoice', Decimal('1234.50'), 'Cash', 'debit', 'INV-1'),
+            (datetime.date(2024, 1, 6), 'Refund', Decimal('20.00'), 'Sales', 'credit', ''),
+            (datetime.date(2024, 1, 7), 'Entry from mapped.csv', Decimal('5.50'), 'General', 'debit', 'INV-2'),
+        ])
+
+    def test_skips_invalid_rows_and_amounts_out_of_range(self):
+        content = (
+            'date,title,amount\n'
+            '2024-01-05,Kept,10.00\n'
+            'not a date,Bad date,10.00\n'
+            '2024-01-06,No amount,\n'
+            '2024-01-07,Too large,10000000000\n'
+            '2024-01-08,Largest,9999999999.99\n'
+        )
+        uploaded_file = self.import_file('invalid.csv', content)
+        self.assertEqual(uploaded_file.processed_entries_count, 2)
+        self.assertEqual([entry[1] for entry in self.entries()], ['Kept', 'Largest'])
+        self.assertIn(
+            'Skipped 3 rows with a missing or invalid amount/date: rows 2, 3, 4',
+            self.log_messages(uploaded_file, 'warning'),
+        )
+
+    def test_rows_without_amount_and_date_columns_are_skipped(self):
+        uploaded_file = self.import_file('columns.csv', 'when,what\n2024-01-05,Lunch\n')
+        self.assertEqual((uploaded_file.status, uploaded_file.processed_entries_count), ('completed', 0))
+        self.assertIn("Skipped 1 rows: no amount/date columns found in ['when', 'what']",
+                      self.log_messages(uploaded_file, 'warning'))
+
+    def test_excel(self):
+        workbook = BytesIO()
+        pd.DataFrame({
+            'Date': ['2024-01-05', '2024-01-06', 'never'],
+            'Memo': ['Invoice', 'Refund', 'Broken'],
+            'Amount': [1234.5, -20, 1],
+            'Type': ['debit', 'credit', 'debit'],
+        }).to_excel(workbook, index=False)
+        uploaded_file = self.import_file('entries.xlsx', workbook.getvalue(), file_type='excel')
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual([entry[1:3] + entry[4:5] for entry in self.entries()], [
+            ('Invoice', Decimal('1234.50'), 'debit'),
+            ('Refund', Decimal('20.00'), 'credit'),
+        ])
+        self.assertIn('Skipped 1 rows with a missing or invalid amount/date: rows 3',
+                      self.log_messages(uploaded_file, 'warning'))
+
+
+class ChunkedImportTests(ImportTestCase):
+    @override_settings(JOURNAL_IMPORT_CHUNK_SIZE=2)
+    def test_csv_is_read_and_committed_chunk_by_chunk(self):
+        rows = [f'2024-01-{day:02d},Entry {day},{day}.00\n' for day in range(1, 6)]
+        rows[3] = '2024-01-04,Too large,10000000000\n'
+        with mock.patch.object(FileProcessor, 'report_progress', autospec=True) as report_progress:
+            with CaptureQueriesContext(connection) as queries:
+                uploaded_file = self.import_file('chunks.csv', 'date,title,amount\n' + ''.join(rows))
+        self.assertEqual(uploaded_file.processed_entries_count, 4)
+        # One batch per chunk, although all rows would fit in one.
+        self.assertEqual(len(self.entry_inserts(queries.captured_queries)), 3)
+        self.assertEqual([call.args[1] for call in report_progress.call_args_list], [2, 3, 4])
+        self.assertEqual(uploaded_file.metrics['stages']['read']['rows'], 5)
+        messages = self.log_messages(uploaded_file)
+        # Row numbers continue across chunks.
+        self.assertIn('Skipped 1 rows with a missing or invalid amount/date: rows 4', messages)
+        self.assertIn('Processed CSV with 5 rows in chunks of 2', messages)
+
+    def test_txt_is_parsed_line_by_line(self):
+        content = (
+            'Journal export\n'
+            '2024-01-05 | Sale | 1,000.00 | Credit\n'
+            '2024-01-06 | Too large | 10000000000.00 | Debit\n'
+            '2024-01-07 | Purchase | (25.00) | Debit\n'
+        )
+        uploaded_file = self.import_file('entries.txt', content, file_type='txt', batch_size=1)
+        self.assertEqual(uploaded_file.processed_entries_count, 2)
+        self.assertEqual(
+            list(uploaded_file.journal_entries.order_by('date').values_list('title', 'amount', 'entry_type')),
+            [('Sale', Decimal('1000.00'), 'credit'), ('Purchase', Decimal('25.00'), 'debit')],
+        )
+        messages = self.log_messages(uploaded_file)
+        self.assertIn("Could not parse line '2024-01-06 | Too large | 10000000000.00 | Debit'", messages)
+        self.assertIn('Processed 4 lines from text file', messages)
+        self.assertIn("Parsed lines as 'pipe' format; 1 non-entry lines skipped", messages)
+
+
+class ProcessingLogBufferTests(ImportTestCase):
+    def test_coalesces_messages_by_error_class(self):
+        uploaded_file = self.upload('logs.csv', '')
+        logs = ProcessingLogBuffer(uploaded_file, samples=2, max_rows=100)
+        for row in range(5):
+            logs.add(f'Bad row {row}', level='warning', error_class='Bad rows')
+        logs.add('Bad error', level='error', error_class='Bad rows')
+        logs.add('Started')
+        self.assertEqual(ProcessingLog.objects.count(), 0)
+        self.assertEqual(len(logs.flush()), 4)
+        self.assertEqual(logs.flush(), [])
+        logs.close()
+        self.assertEqual(sorted(self.log_messages(uploaded_file)), [
+            'Bad error', 'Bad row 0', 'Bad row 1',
+            'Bad rows: 5 occurrences in total, 3 not shown', 'Started',
+        ])
+
+    def test_caps_stored_rows_but_keeps_errors(self):
+        uploaded_file = self.upload('logs.csv', '')
+        logs = ProcessingLogBuffer(uploaded_file, samples=10, max_rows=3)
+        for row in range(5):
+            logs.add(f'Row {row}')
+        logs.add('Failed', level='error')
+        logs.close()
+        self.assertEqual(sorted(self.log_messages(uploaded_file)), [
+            '2 further log messages suppressed (limit 3 per file)', 'Failed', 'Row 0', 'Row 1', 'Row 2',
+        ])
+
+    @override_settings(JOURNAL_LOG_SAMPLES_PER_CLASS=1)
+    def test_import_logs_a_sample_and_a_summary_per_class(self):
+        content = 'Journal export\n' + ''.join(f'2024-01-{day:02d} | Line {day} |\n' for day in range(1, 5))
+        content += '2024-01-05 | Sale | 10.00 | Credit\n'
+        with CaptureQueriesContext(connection) as queries:
+            uploaded_file = self.import_file('unparsed.txt', content, file_type='txt')
+        self.assertEqual(uploaded_file.processed_entries_count, 1)
+        self.assertEqual(sorted(self.log_messages(uploaded_file, 'warning')), [
+            "Could not parse line '2024-01-01 | Line 1 |'", 'Unparsed lines: 4 occurrences in total, 3 not shown',
+        ])
+        log_table = ProcessingLog._meta.db_table
+        log_inserts = [query for query in queries.captured_queries if f'INSERT INTO "{log_table}"' in query['sql']]
+        # One write when the only batch commits and one when the job ends.
+        self.assertEqual(len(log_inserts), 2)
+
+
+@override_settings(JOURNAL_QUEUE_IN_PROCESS_WORKERS=0)
+class UploadDedupTests(ImportTestCase):
+    CSV = ImportQueueTests.CSV
+
+    def post(self, content, name='entries.csv', client=None):
+        client = client or APIClient()
+        return client.post(reverse('api_upload'), {'file': SimpleUploadedFile(name, content.encode())})
+
+    def test_repeat_upload_returns_the_earlier_file(self):
+        first = self.post(self.CSV)
+        self.assertEqual(first.status_code, 201)
+        uploaded_file = UploadedFile.objects.get(pk=first.data['id'])
+        self.assertEqual(uploaded_file.sha256, hashlib.sha256(self.CSV.encode()).hexdigest())
+
+        again = self.post(self.CSV, name='renamed.csv')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], first.data['id'])
+        self.assertEqual(UploadedFile.objects.count(), 1)
+
+        self.assertEqual(self.post(self.CSV + '2024-01-07,30.00,Cash,debit\n').status_code, 201)
+
+    def test_failed_uploads_and_other_users_are_not_reused(self):
+        first = self.post(self.CSV)
+        UploadedFile.objects.filter(pk=first.data['id']).update(status='failed')
+        retry = self.post(self.CSV)
+        self.assertEqual(retry.status_code, 201)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('uploader'))
+        other = self.post(self.CSV, client=client)
+        self.assertEqual(other.status_code, 201)
+        self.assertEqual(self.post(self.CSV, client=client).data['id'], other.data['id'])
+        self.assertEqual(UploadedFile.objects.count(), 3)
+
+    def test_upload_page_reports_the_earlier_file(self):
+        self.post(self.CSV)
+        response = self.client.post(
+            reverse('upload_file'), {'file': SimpleUploadedFile('again.csv', self.CSV.encode())}, follow=True
+        )
+        self.assertIn('was already uploaded', [str(message) for message in response.context['messages']][0])
+        self.assertEqual(UploadedFile.objects.count(), 1)
+
+
+class CSVDateImportTests(ImportTestCase):
+    def dates(self):
+        return sorted(set(JournalEntry.objects.filter(project=self.project).values_list('date', flat=True)))
+
+    def test_ambiguous_file_reads_month_first(self):
+        rows = ''.join(f'03/04/2024,Entry {i},10.00\n' for i in range(3))
+        uploaded_file = self.import_file('ambiguous.csv', 'date,title,amount\n' + rows)
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual(self.dates(), [datetime.date(2024, 3, 4)])
+
+    def test_later_unambiguous_rows_decide_the_order(self):
+        # The first 120 rows fit either order; row 121 is only valid day-first.
+        rows = ''.join(f'03/04/2024,Entry {i},10.00\n' for i in range(120)) + '13/04/2024,Last,10.00\n'
+        uploaded_file = self.import_file('late.csv', 'date,title,amount\n' + rows)
+        self.assertEqual(uploaded_file.status, 'completed')
+        self.assertEqual(self.dates(), [datetime.date(2024, 4, 3), datetime.date(2024, 4, 13)])
+
+    def test_conflicting_orders_fail_the_import(self):
+        rows = '03/04/2024,A,1\n13/04/2024,B,1\n04/13/2024,C,1\n04/14/2024,D,1\n'
+        uploaded_file = self.import_file('mixed.csv', 'date,title,amount\n' + rows)
+        self.assertEqual(uploaded_file.status, 'failed')
+        self.assertIn("'13/04/2024'", uploaded_file.error_message)
+        self.assertTrue(self.log_messages(uploaded_file, 'error'))
+
+    @override_settings(JOURNAL_IMPORT_CHUNK_SIZE=2)
+    def test_failed_import_removes_the_batches_it_committed(self):
+        rows = '13/04/2024,A,1\n14/04/2024,B,2\n04/13/2024,C,3\n04/14/2024,D,4\n'
+        uploaded_file = self.import_file('late-conflict.csv', 'date,title,amount\n' + rows)
+        self.assertEqual((uploaded_file.status, uploaded_file.processed_entries_count), ('failed', 0))
+        self.assertFalse(JournalEntry.objects.exists())
+        self.assertEqual(Project.objects.get(pk=self.project.pk).entry_count, 0)
+        self.assertFalse(LedgerRollup.objects.exists())
+        self.assertEqual(list(project_totals_mismatches()), [])
+        self.assertIn('Removed 2 entries imported before the failure', self.log_messages(uploaded_file, 'warning'))
+
+
+class ImportProfileTests(TestCase):
+    def test_nested_stages_are_excluded_from_their_parent(self):
+        profile = ImportProfile.from_metrics({'stages': {'sniff': {'wall': 0.5, 'cpu': 0.5, 'calls': 1, 'rows': 0}}})
+        profile.start()
+        with profile.stage('map'):
+            with profile.stage('write', rows=10):
+                time.sleep(0.05)
+            time.sleep(0.02)
+            profile.add('parse', 0.02, rows=10)
+        metrics = profile.as_dict()
+        self.assertEqual(set(metrics['stages']), {'sniff', 'map', 'write', 'parse'})
+        self.assertGreaterEqual(metrics['stages']['write']['wall'], 0.05)
+        self.assertLess(abs(metrics['stages']['map']['wall']), 0.01)
+        self.assertIsNone(metrics['stages']['parse']['cpu'])
+        self.assertGreaterEqual(metrics['wall'], 0.05)
+
+
+class RequestMetricsTests(TestCase):
+    def test_metrics_endpoint_reports_views_and_queries(self):
+        Project.objects.create(name='Metrics')
+        with self.assertLogs('journal_app.middleware', 'WARNING') as logs, \
+                self.settings(JOURNAL_SLOW_REQUEST_QUERIES=0):
+            self.client.get(reverse('api_projects'))
+        self.assertIn('api_projects', logs.output[0])
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'journal_http_request_db_queries_bucket{view="api_projects",method="GET",le="2"}', body
+        )
+        self.assertIn('journal_http_responses_total{view="api_projects",method="GET",status="200"}', body)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+
+class ReadThroughCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.project = Project.objects.create(name='Cached')
+
+    def add_entry(self, amount):
+        return JournalEntry.objects.create(
+            project=self.project, title='Entry', entry_type='debit',
+            amount=Decimal(amount), date='2024-01-01', account_name='Cash'
+        )
+
+    def test_summary_is_cached_until_an_entry_is_written(self):
+        url = reverse('api_project_detail', args=[self.project.id])
+        self.assertEqual(self.client.get(url).json()['total_entries'], 0)
+        hits = CACHE_REQUESTS.value(cache='projects', result='hit')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['total_entries'], 0)
+        self.assertEqual(CACHE_REQUESTS.value(cache='projects', result='hit'), hits + 1)
+
+        entry = self.add_entry('5.00')
+        self.assertEqual(self.client.get(url).json()['total_debits'], 5.0)
+        entry.delete()
+        self.assertEqual(self.client.get(url).json()['total_entries'], 0)
+
+    def test_first_entry_pages_follow_writes(self):
+        url = reverse('api_project_entries', args=[self.project.id])
+        self.add_entry('1.00')
+        self.assertEqual(len(self.client.get(url).json()['results']), 1)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.add_entry('2.00')
+        self.assertEqual(len(self.client.get(url).json()['results']), 2)
+        self.assertEqual(len(self.client.get(reverse('api_entries')).json()['results']), 2)
+        self.assertEqual(len(self.client.get(reverse('entry_list')).context['entries']), 2)
+
+    def entry_titles(self):
+        url = reverse('api_project_entries', args=[self.project.id])
+        return [entry['title'] for entry in self.client.get(url).json()['results']]
+
+    def test_entry_pages_follow_writes_to_other_fields(self):
+        entry = self.add_entry('1.00')
+        self.assertEqual(self.entry_titles(), ['Entry'])
+        entry.title = 'Renamed'
+        entry.save(update_fields=['title'])
+        self.assertEqual(self.entry_titles(), ['Renamed'])
+        JournalEntry.objects.filter(pk=entry.pk).update(title='Updated')
+        self.assertEqual(self.entry_titles(), ['Updated'])
+
+    def test_entry_pages_follow_source_file_deletes(self):
+        url = reverse('api_project_entries', args=[self.project.id])
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/gone.csv', original_filename='gone.csv', file_type='csv', file_size=1,
+        )
+        entry = self.add_entry('1.00')
+        entry.source_file = uploaded_file
+        entry.save()
+        self.assertEqual(self.client.get(url).json()['results'][0]['source_file'], str(uploaded_file.pk))
+        uploaded_file.delete()
+        self.assertIsNone(self.client.get(url).json()['results'][0]['source_file'])
+
+
+class EntryFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.project = Project.objects.create(name='Filters')
+        self.upload = UploadedFile.objects.create(
+            file='uploads/march.csv', original_filename='march.csv', file_type='csv', file_size=1
+        )
+        for day, account, entry_type, amount in [
+            ('2024-03-01', 'Accounts Receivable', 'debit', '10.00'),
+            ('2024-03-15', 'Accounts Receivable', 'credit', '250.00'),
+            ('2024-04-02', 'Accounts Receivable', 'debit', '30.00'),
+            ('2024-03-20', 'Accounts Payable', 'debit', '40.00'),
+            ('2024-03-21', 'accounts payable', 'debit', '50.00'),
+        ]:
+            JournalEntry.objects.create(
+                project=self.project, title=account, entry_type=entry_type, amount=Decimal(amount),
+                date=day, account_name=account, reference_number=f'R-{day}', source_file=self.upload,
+            )
+
+    def get(self, **params):
+        return self.client.get(reverse('api_entries'), params)
+
+    def amounts(self, **params):
+        response = self.get(fields='amount', **params)
+        self.assertEqual(response.status_code, 200)
+        return [row['amount'] for row in response.json()['results']]
+
+    def test_filters_combine(self):
+        march = {'date_from': '2024-03-01', 'date_to': '2024-03-31'}
+        self.assertEqual(self.amounts(account='Accounts Receivable', **march), ['250.00', '10.00'])
+        self.assertEqual(self.amounts(account_prefix='Accounts ', entry_type='debit', **march), ['40.00', '10.00'])
+        self.assertEqual(self.amounts(amount_min='30', amount_max='50', project=self.project.id),
+                         ['30.00', '50.00', '40.00'])
+        self.assertEqual(self.amounts(reference='R-2024-04-02'), ['30.00'])
+        self.assertEqual(len(self.amounts(source_file=self.upload.id)), 5)
+        self.assertEqual(self.amounts(source_file=uuid.uuid4()), [])
+
+        response = self.get(date_from='2024-02-30', entry_type='refund')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'date_from', 'entry_type'})
+
+    def test_fields_projection(self):
+        row = self.get(fields='date, amount,source_file', account='Accounts Payable').json()['results'][0]
+        self.assertEqual(row, {'date': '2024-03-20', 'amount': '40.00', 'source_file': str(self.upload.id)})
+        self.assertEqual(self.get(fields='amount,secret').status_code, 400)
+
+        # Paging still works: the cursor columns are selected regardless.
+        page = self.get(fields='id', page_size=2).json()
+        self.assertEqual(set(page['results'][0]), {'id'})
+        self.assertEqual(len(self.client.get(page['next']).json()['results']), 2)
+
+    def test_account_month_uses_account_index(self):
+        queryset = JournalEntry.objects.filter(
+            account_name='Accounts Receivable', date__gte='2024-03-01', date__lte='2024-03-31'
+        ).order_by(*JournalEntryPagination.ordering)
+        plan = queryset.explain()
+        self.assertIn('entry_account_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.project = Project.objects.create(name='Search')
+
+    def add_entry(self, title, **fields):
+        return JournalEntry.objects.create(
+            project=self.project, title=title, entry_type='debit', amount=Decimal('1.00'),
+            date='2024-01-01', account_name=fields.pop('account_name', 'Cash'), **fields
+        )
+
+    def search(self, text, **params):
+        response = self.client.get(reverse('api_entries'), {'q': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_api_ranks_matches_and_follows_writes(self):
+        self.add_entry('Office rent', description='Invoice for the office')
+        best = self.add_entry('Invoice 42', reference_number='INV-42')
+        self.add_entry('Payroll', account_name='Salaries')
+
+        results = self.search('invoice')['results']
+        self.assertEqual([row['title'] for row in results], ['Invoice 42', 'Office rent'])
+        self.assertEqual(self.search('inv-4')['results'][0]['id'], str(best.id))
+        self.assertEqual(len(self.search('')['results']), 3)
+
+        best.title = 'Refund'
+        best.save()
+        JournalEntry.objects.filter(title='Office rent').delete()
+        self.assertEqual([row['title'] for row in self.search('inv')['results']], ['Refund'])
+        self.assertEqual(self.search('"')['results'], [])
+        self.assertEqual(rebuild_index(), 2)
+        check_index()
+
+    def test_ranked_results_page_by_cursor(self):
+        # Bulk-inserted, as by an import.
+        writer = JournalEntryWriter(batch_size=10)
+        for i in range(5):
+            writer.add(JournalEntry(project=self.project, title=f'Rent {i}', entry_type='debit',
+                                    amount=Decimal('1.00'), date='2024-01-01', account_name='Cash'))
+        writer.flush()
+        page = self.search('rent', page_size=2)
+        seen = [row['id'] for row in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen += [row['id'] for row in page['results']]
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_admin_search_uses_index_and_project_name(self):
+        entry = self.add_entry('Utilities')
+        self.assertEqual(list(JournalEntry.objects.filter(search_filter('utilit'))), [entry])
+        self.assertEqual(list(JournalEntry.objects.filter(search_filter('search'))), [entry])
+
+
+class SearchIndexRebuildTests(TransactionTestCase):
+    # Rebuilding a table needs foreign key checks off, so not in a TestCase.
+
+    def titles(self, text):
+        return sorted(JournalEntry.objects.filter(search_filter(text)).values_list('title', flat=True))
+
+    def test_index_survives_a_table_rebuild_and_rebuild_restores_triggers(self):
+        self.addCleanup(rebuild_index)
+        project = Project.objects.create(name='Ledger')
+        for title in ['Rent March', 'Rent April', 'Payroll']:
+            JournalEntry.objects.create(project=project, title=title, entry_type='debit', amount=Decimal('1.00'),
+                                        date='2024-01-01', account_name='Cash')
+        JournalEntry.objects.filter(title='Rent March').delete()
+        check_index()
+
+        # What a migration altering JournalEntry does on SQLite; it renumbers
+        # rowids and drops the triggers.
+        with connection.schema_editor() as editor:
+            editor._remake_table(JournalEntry)
+        self.assertEqual(self.titles('rent'), ['Rent April'])
+        with self.assertRaisesMessage(DatabaseError, 'missing trigger(s)'):
+            check_index()
+
+        JournalEntry.objects.create(project=project, title='Rent May', entry_type='debit', amount=Decimal('1.00'),
+                                    date='2024-01-01', account_name='Cash')
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(rebuild_index(), 3)
+        check_index()
+        self.assertEqual(self.titles('rent'), ['Rent April', 'Rent May'])
+
+        JournalEntry.objects.filter(title='Payroll').update(title='Rent June')
+        JournalEntry.objects.filter(title='Rent April').delete()
+        self.assertEqual(self.titles('rent'), ['Rent June', 'Rent May'])
+        check_index()
+
+    def test_check_reports_entries_missing_from_the_index(self):
+        project = Project.objects.create(name='Ledger')
+        entry = JournalEntry.objects.create(project=project, title='Rent', entry_type='debit',
+                                            amount=Decimal('1.00'), date='2024-01-01', account_name='Cash')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {IDS_TABLE} WHERE entry_id = %s', [entry.id.hex])
+        with self.assertRaisesMessage(DatabaseError, '1 entries not indexed'):
+            check_index()
+        rebuild_index()
+        check_index()
+
+
+class FileEventsTests(TestCase):
+    def test_broker_delivers_across_threads(self):
+        async def receive():
+            subscription = BROKER.subscribe('job')
+            try:
+                await asyncio.to_thread(BROKER.publish, 'job', {'status': 'processing'})
+                return await subscription.get(timeout=1)
+            finally:
+                subscription.close()
+
+        self.assertEqual(asyncio.run(receive()), {'status': 'processing'})
+        self.assertFalse(BROKER.has_subscribers('job'))
+
+    def test_wsgi_fallback_sends_current_state(self):
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/done.csv', original_filename='done.csv', file_type='csv', file_size=1,
+            status='completed', processed_entries_count=3,
+        )
+        response = self.client.get(reverse('file_events', args=[uploaded_file.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn('"processed_entries": 3', body)
+        self.assertIn('event: done', body)
+
+    @override_settings(JOURNAL_EVENTS_HEARTBEAT=20)
+    def test_wsgi_fallback_reconnects_once_per_heartbeat(self):
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/busy.csv', original_filename='busy.csv', file_type='csv', file_size=1,
+            status='processing',
+        )
+        response = self.client.get(reverse('file_events', args=[uploaded_file.id]))
+        self.assertTrue(response.content.decode().startswith('retry: 20000\n'))
+
+    def test_wsgi_fallback_resends_only_logs_after_last_event_id(self):
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/busy.csv', original_filename='busy.csv', file_type='csv', file_size=1,
+            status='processing',
+        )
+        seen = ProcessingLog.objects.create(uploaded_file=uploaded_file, message='Seen', level='info')
+        new = ProcessingLog.objects.create(uploaded_file=uploaded_file, message='New', level='info')
+        response = self.client.get(
+            reverse('file_events', args=[uploaded_file.id]), HTTP_LAST_EVENT_ID=str(seen.pk)
+        )
+        body = response.content.decode()
+        self.assertIn(f'id: {new.pk}\n', body)
+        self.assertIn('"New"', body)
+        self.assertNotIn('"Seen"', body)
+        self.assertNotIn('event: done', body)
+
+    def test_stream_rechecks_the_database(self):
+        # Jobs run by run_import_workers publish nothing to this process.
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/worker.csv', original_filename='worker.csv', file_type='csv', file_size=1,
+            status='processing',
+        )
+        ProcessingLog.objects.create(uploaded_file=uploaded_file, message='Started', level='info')
+
+        async def run():
+            stream = stream_file_events(uploaded_file.id, heartbeat=0.01)
+            first = await anext(stream)
+            await ProcessingLog.objects.acreate(uploaded_file=uploaded_file, message='Batch', level='info')
+            await UploadedFile.objects.filter(pk=uploaded_file.pk).aupdate(
+                status='completed', processed_entries_count=2
+            )
+            return first, [message async for message in stream if not message.startswith(':')]
+
+        first, rest = async_to_sync(run)()
+        self.assertIn('"Started"', first)
+        self.assertEqual(len(rest), 2)
+        self.assertIn('"Batch"', rest[0])
+        self.assertNotIn('"Started"', rest[0])
+        self.assertIn('"completed"', rest[0])
+        self.assertIn('event: done', rest[1])
+
+    def test_stream_of_a_job_processed_here_waits_for_its_events(self):
+        uploaded_file = UploadedFile.objects.create(
+            file='uploads/local.csv', original_filename='local.csv', file_type='csv', file_size=1,
+            status='processing',
+        )
+
+        async def run():
+            stream = stream_file_events(uploaded_file.id, heartbeat=0.01)
+            await anext(stream)
+            keep_alives = [await anext(stream) for _ in range(3)]
+            uploaded_file.status = 'completed'
+            publish_file_status(uploaded_file)
+            return keep_alives, [message async for message in stream]
+
+        with publishing_file_status(uploaded_file), mock.patch.object(
+            events, 'current_file_status', wraps=events.current_file_status
+        ) as current_file_status:
+            keep_alives, rest = async_to_sync(run)()
+        self.assertEqual(keep_alives, [': keep-alive\n\n'] * 3)
+        # Only the initial state was read from the database.
+        self.assertEqual(current_file_status.call_count, 1)
+        self.assertIn('"completed"', rest[0])
+        self.assertIn('event: done', rest[1])
+        self.assertFalse(BROKER.is_published(str(uploaded_file.pk)))
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Computes the SHA-256 of each uploaded file as its chunks stream in.
+
+    Must come first in FILE_UPLOAD_HANDLERS: it passes every chunk on
+    unchanged and leaves storing the file to the handlers after it.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_sha256 = getattr(self.request, 'upload_sha256', {})
+        self.request.upload_sha256[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def upload_sha256(request, field_name, file):
+    """SHA-256 recorded by HashingUploadHandler, or computed from ``file``."""
+    digest = getattr(request, 'upload_sha256', {}).get(field_name)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        file.seek(0)
+        digest = hasher.hexdigest()
+    return digest
@@ -5,16 +5,22 @@ urlpatterns = [
     path('', views.JournalEntryListView.as_view(), name='entry_list'),
     path('upload/', views.upload_file_view, name='upload_file'),
     path('file-status/<uuid:file_id>/', views.file_status_view, name='file_status'),
+    path('file-events/<uuid:file_id>/', views.file_events_view, name='file_events'),
+    path('metrics/', views.metrics_view, name='metrics'),
     
     # API endpoints - Projects
     path('api/projects/', views.ProjectListCreateAPI.as_view(), name='api_projects'),
     path('api/projects/<uuid:id>/', views.ProjectDetailAPI.as_view(), name='api_project_detail'),
     path('api/projects/<uuid:project_id>/entries/', views.ProjectEntriesAPI.as_view(), name='api_project_entries'),
+    path('api/projects/<uuid:project_id>/trial-balance/', views.project_trial_balance_api, name='api_project_trial_balance'),
+    path('api/projects/<uuid:project_id>/monthly/', views.project_monthly_totals_api, name='api_project_monthly_totals'),
     path('api/projects/<uuid:project_id>/team/add/', views.add_team_member_api, name='api_add_team_member'),
     path('api/projects/<uuid:project_id>/team/<int:user_id>/remove/', views.remove_team_member_api, name='api_remove_team_member'),
     
     # API endpoints - Journal Entries
     path('api/entries/', views.JournalEntryListCreateAPI.as_view(), name='api_entries'),
+    path('api/entries/bulk/', views.bulk_entries_api, name='api_entries_bulk'),
+    path('api/entries/export/', views.export_entries_view, name='api_entries_export'),
     
     # API endpoints - File Uploads
     path('api/upload/', views.upload_file_api, name='api_upload'),
@@ -1,42 +1,99 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, CreateView
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from .models import JournalEntry, UploadedFile, Project
 from .forms import FileUploadForm, JournalEntryForm
-from .file_processors import FileProcessor
+from .pagination import JournalEntryPagination, UploadedFilePagination, paginate_keyset
+from . import jobs
+from .caching import cached_value, project_version
+from .events import (
+    FINISHED_STATUSES, current_file_status, file_status_payload, format_event, last_log_id, parse_last_event_id,
+    stream_file_events,
+)
+from .exporters import EXPORT_FORMATS, ExportTooLarge, check_export_size, export_queryset, iter_export
+from .filters import filter_entries, parse_iso_date
+from .ledger import monthly_totals, rollup_queryset, trial_balance
+from .metrics import REGISTRY
+from .parsers import NDJSONParser
+from .profiling import ImportProfile
+from .search import SEARCH_ORDERING, search_entries
+from .uploadhandlers import upload_sha256
 from .serializers import (
-    JournalEntrySerializer, UploadedFileSerializer, 
-    ProjectSerializer, ProjectCreateSerializer
+    JournalEntrySerializer, JournalEntryRowSerializer, JournalEntryBulkSerializer,
+    UploadedFileSerializer, ProjectSerializer, ProjectCreateSerializer
 )
 import magic
-import threading
+import uuid
 
 class JournalEntryListView(ListView):
     model = JournalEntry
     template_name = 'journal_app/entry_list.html'
     context_object_name = 'entries'
     paginate_by = 20
+    
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset paging: no COUNT(*), and deep pages cost the same as the first.
+        cursor = self.request.GET.get('cursor')
+        if not cursor:
+            # The first page is what almost every visit shows; see caching.py.
+            page = cached_value('entry_pages', f'html:{page_size}', ['entries'], lambda: paginate_keyset(
+                queryset, JournalEntryPagination.ordering, page_size
+            ))
+            return None, page, page.items, bool(page.next_cursor)
+        try:
+            page = paginate_keyset(queryset, JournalEntryPagination.ordering, page_size, cursor)
+        except ValueError:
+            raise Http404('Invalid cursor')
+        return None, page, page.items, bool(page.next_cursor or page.previous_cursor)
+
+def find_duplicate_upload(sha256, user):
+    # Failed imports are not reused, so re-uploading the same file retries it.
+    return (UploadedFile.objects.filter(sha256=sha256, user=user)
+            .exclude(status='failed').order_by('uploaded_at').first())
 
 def upload_file_view(request):
     if request.method == 'POST':
         form = FileUploadForm(request.POST, request.FILES)
         if form.is_valid():
+            user = request.user if request.user.is_authenticated else None
+            sha256 = upload_sha256(request, 'file', form.cleaned_data['file'])
+            duplicate = find_duplicate_upload(sha256, user)
+            if duplicate is not None:
+                messages.info(request, f'File "{duplicate.original_filename}" was already uploaded on '
+                                       f'{duplicate.uploaded_at:%b %d, %Y %H:%M} ({duplicate.get_status_display()}, '
+                                       f'{duplicate.processed_entries_count} entries); it was not imported again.')
+                return redirect('upload_file')
+            
+            try:
+                jobs.check_capacity()
+            except jobs.QueueFull as e:
+                messages.error(request, str(e))
+                return redirect('upload_file')
+            
             uploaded_file = form.save(commit=False)
-            uploaded_file.user = request.user if request.user.is_authenticated else None
+            uploaded_file.user = user
+            uploaded_file.sha256 = sha256
             uploaded_file.original_filename = uploaded_file.file.name
             uploaded_file.file_size = uploaded_file.file.size
             
             # Determine file type
-            file_content = uploaded_file.file.read(1024)
-            uploaded_file.file.seek(0)
-            file_type = magic.from_buffer(file_content, mime=True)
+            profile = ImportProfile()
+            with profile.stage('sniff'):
+                file_content = uploaded_file.file.read(1024)
+                uploaded_file.file.seek(0)
+                file_type = magic.from_buffer(file_content, mime=True)
+            uploaded_file.metrics = profile.as_dict()
             
             if 'pdf' in file_type:
                 uploaded_file.file_type = 'pdf'
@@ -50,9 +107,7 @@ def upload_file_view(request):
             uploaded_file.save()
             
             # Process file in background
-            processor = FileProcessor(uploaded_file)
-            thread = threading.Thread(target=processor.process)
-            thread.start()
+            jobs.enqueue(uploaded_file)
             
             messages.success(request, f'File "{uploaded_file.original_filename}" uploaded successfully! Processing in background.')
             return redirect('upload_file')
@@ -67,17 +122,89 @@ def upload_file_view(request):
 
 def file_status_view(request, file_id):
     file_obj = get_object_or_404(UploadedFile, id=file_id)
-    return JsonResponse({
-        'status': file_obj.status,
-        'processed_entries': file_obj.processed_entries_count,
-        'error_message': file_obj.error_message,
-        'logs': [{'message': log.message, 'level': log.level, 'timestamp': log.timestamp} 
-                for log in file_obj.logs.all()[:10]]
-    })
+    payload = file_status_payload(file_obj, file_obj.logs.all()[:10])
+    payload['metrics'] = file_obj.metrics
+    return JsonResponse(payload)
+
+async def file_events_view(request, file_id):
+    # Server-Sent Events pushed by the processor (see journal_app.events);
+    # the stream ends once the job has completed or failed.
+    if not await UploadedFile.objects.filter(id=file_id).aexists():
+        raise Http404
+    # Set by EventSource on reconnect: only logs after it are sent again.
+    after = parse_last_event_id(request.headers.get('Last-Event-ID'))
+    heartbeat = getattr(settings, 'JOURNAL_EVENTS_HEARTBEAT', 15)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker cannot hold the stream open; send the current state
+        # and let EventSource reconnect, which degrades to polling once per
+        # heartbeat, as often as an open stream re-reads the database.
+        event = await current_file_status(file_id, after)
+        body = f'retry: {int(heartbeat * 1000)}\n' + format_event(event, event_id=last_log_id(event, after))
+        if event['status'] in FINISHED_STATUSES:
+            body += format_event({}, event='done')
+        return HttpResponse(body, content_type='text/event-stream')
+    
+    response = StreamingHttpResponse(
+        stream_file_events(file_id, heartbeat=heartbeat, after=after),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def export_entries_view(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}, status=400)
+    
+    dates = {}
+    for param in ('date_from', 'date_to'):
+        value = request.GET.get(param)
+        if value:
+            try:
+                dates[param] = parse_iso_date(value)
+            except ValueError as e:
+                return JsonResponse({'error': f'{param}: {e}'}, status=400)
+    
+    project_id = request.GET.get('project')
+    if project_id:
+        try:
+            project_id = uuid.UUID(project_id)
+        except ValueError:
+            return JsonResponse({'error': 'project must be a project id'}, status=400)
+    
+    queryset = export_queryset(project_id, dates.get('date_from'), dates.get('date_to'))
+    try:
+        check_export_size(queryset, export_format)
+    except ExportTooLarge as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(iter_export(queryset, export_format), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="journal_entries.{extension}"'
+    return response
+
+def metrics_view(request):
+    # Prometheus scrape endpoint; only served to the addresses in JOURNAL_METRICS_ALLOWED_IPS.
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'JOURNAL_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        raise Http404
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # API Views
+def project_queryset():
+    # Ledger totals are stored on the project row, so owner and team members
+    # are the only relations ProjectSerializer needs; fetch them up front to
+    # keep the query count independent of the number of projects.
+    return Project.objects.select_related('owner').prefetch_related('team_members')
+
 class ProjectListCreateAPI(generics.ListCreateAPIView):
-    queryset = Project.objects.all()
+    def get_queryset(self):
+        return project_queryset()
+    
+    def list(self, request, *args, **kwargs):
+        data = cached_value('projects', 'list', ['projects'], lambda: list(
+            self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data
+        ))
+        return Response(data)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -92,12 +219,109 @@ class ProjectListCreateAPI(generics.ListCreateAPIView):
             serializer.save()
 
 class ProjectDetailAPI(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     lookup_field = 'id'
+    
+    def get_queryset(self):
+        return project_queryset()
+    
+    def retrieve(self, request, *args, **kwargs):
+        project_id = self.kwargs['id']
+        data = cached_value('projects', f'detail:{project_id}', [project_version(project_id)],
+                            lambda: dict(self.get_serializer(self.get_object()).data))
+        return Response(data)
 
-class ProjectEntriesAPI(generics.ListAPIView):
-    serializer_class = JournalEntrySerializer
+class JournalEntryRowListMixin:
+    # Listings are rendered from .values() rows (project name joined in) by
+    # JournalEntryRowSerializer, which produces the same JSON as
+    # JournalEntrySerializer at a fraction of the cost. Writes still go
+    # through the model serializer.
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return JournalEntryRowSerializer
+        return JournalEntrySerializer
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs['fields'] = self.selected_fields()
+        return super().get_serializer(*args, **kwargs)
+    
+    def selected_fields(self):
+        # ?fields=date,amount narrows both the JSON and the SELECT.
+        value = self.request.query_params.get('fields')
+        if self.request.method != 'GET' or not value:
+            return None
+        try:
+            return JournalEntryRowSerializer.parse_fields(value)
+        except ValueError as e:
+            raise ValidationError({'fields': str(e)})
+    
+    def search_text(self):
+        if self.request.method != 'GET':
+            return ''
+        return self.request.query_params.get('q', '').strip()
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method == 'GET':
+            queryset = filter_entries(queryset, self.request.query_params)
+            queryset = JournalEntryRowSerializer.rows(queryset, self.selected_fields())
+            # ?q= ranks matches through the full-text index (search.py).
+            if self.search_text():
+                queryset = search_entries(queryset, self.search_text())
+        return queryset
+    
+    def get_keyset_ordering(self, ordering):
+        return SEARCH_ORDERING if self.search_text() else ordering
+    
+    def cache_versions(self):
+        project_id = self.kwargs.get('project_id') or self.request.query_params.get('project')
+        if not project_id:
+            return ['entries']
+        try:
+            return [project_version(uuid.UUID(str(project_id)))]
+        except ValueError:
+            return None
+    
+    def list(self, request, *args, **kwargs):
+        # Only first pages are cached: they take most of the traffic, and
+        # keying on the full URL keeps page_size variants apart.
+        versions = self.cache_versions()
+        if 'cursor' in request.query_params or versions is None:
+            return super().list(request, *args, **kwargs)
+        parent = super()
+        data = cached_value('entry_pages', request.build_absolute_uri(), versions,
+                            lambda: parent.list(request, *args, **kwargs).data)
+        return Response(data)
+
+def project_rollups(request, project_id):
+    # Reports read LedgerRollup (one row per project/month/account/type)
+    # rather than aggregating JournalEntry, so date bounds are whole months.
+    get_object_or_404(Project.objects.only('id'), id=project_id)
+    dates = {}
+    for param in ('date_from', 'date_to'):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                dates[param] = parse_iso_date(value)
+            except ValueError as e:
+                raise ValidationError({param: str(e)})
+    return rollup_queryset(
+        project_id, dates.get('date_from'), dates.get('date_to'), request.query_params.get('account')
+    )
+
+@api_view(['GET'])
+def project_trial_balance_api(request, project_id):
+    accounts = trial_balance(project_rollups(request, project_id))
+    return Response({'project': str(project_id), 'accounts': accounts})
+
+@api_view(['GET'])
+def project_monthly_totals_api(request, project_id):
+    months = monthly_totals(project_rollups(request, project_id))
+    return Response({'project': str(project_id), 'months': months})
+
+class ProjectEntriesAPI(JournalEntryRowListMixin, generics.ListAPIView):
+    pagination_class = JournalEntryPagination
     
     def get_queryset(self):
         project_id = self.kwargs['project_id']
@@ -134,20 +358,28 @@ def remove_team_member_api(request, project_id, user_id):
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class JournalEntryListCreateAPI(generics.ListCreateAPIView):
+class JournalEntryListCreateAPI(JournalEntryRowListMixin, generics.ListCreateAPIView):
+    # Listings are filtered by ?project=, ?date_from= etc.; see filters.py.
     queryset = JournalEntry.objects.all()
-    serializer_class = JournalEntrySerializer
+    pagination_class = JournalEntryPagination
+
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+def bulk_entries_api(request):
+    # Accepts a JSON array or NDJSON; nothing is written unless every item is valid.
+    upsert = request.query_params.get('upsert', '').lower() in ('1', 'true', 'yes')
+    serializer = JournalEntryBulkSerializer(request.data, upsert=upsert)
+    if not serializer.is_valid():
+        return Response({'created': 0, 'updated': 0, 'errors': serializer.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
     
-    def get_queryset(self):
-        queryset = JournalEntry.objects.all()
-        project_id = self.request.query_params.get('project', None)
-        if project_id:
-            queryset = queryset.filter(project_id=project_id)
-        return queryset
+    created, updated = serializer.save()
+    return Response({'created': created, 'updated': updated, 'errors': []}, status=status.HTTP_201_CREATED)
 
 class UploadedFileListAPI(generics.ListAPIView):
     queryset = UploadedFile.objects.all()
     serializer_class = UploadedFileSerializer
+    pagination_class = UploadedFilePagination
 
 @api_view(['POST'])
 def upload_file_api(request):
@@ -156,15 +388,32 @@ def upload_file_api(request):
     
     form = FileUploadForm(request.POST, request.FILES)
     if form.is_valid():
+        user = request.user if request.user.is_authenticated else None
+        sha256 = upload_sha256(request, 'file', form.cleaned_data['file'])
+        duplicate = find_duplicate_upload(sha256, user)
+        if duplicate is not None:
+            # 200 rather than 201: the earlier upload (and its entries) is returned.
+            return Response(UploadedFileSerializer(duplicate).data, status=status.HTTP_200_OK)
+        
+        try:
+            jobs.check_capacity()
+        except jobs.QueueFull as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': '30'})
+        
         uploaded_file = form.save(commit=False)
-        uploaded_file.user = request.user if request.user.is_authenticated else None
+        uploaded_file.user = user
+        uploaded_file.sha256 = sha256
         uploaded_file.original_filename = uploaded_file.file.name
         uploaded_file.file_size = uploaded_file.file.size
         
         # Determine file type
-        file_content = uploaded_file.file.read(1024)
-        uploaded_file.file.seek(0)
-        file_type = magic.from_buffer(file_content, mime=True)
+        profile = ImportProfile()
+        with profile.stage('sniff'):
+            file_content = uploaded_file.file.read(1024)
+            uploaded_file.file.seek(0)
+            file_type = magic.from_buffer(file_content, mime=True)
+        uploaded_file.metrics = profile.as_dict()
         
         if 'pdf' in file_type:
             uploaded_file.file_type = 'pdf'
@@ -178,9 +427,7 @@ def upload_file_api(request):
         uploaded_file.save()
         
         # Process file in background
-        processor = FileProcessor(uploaded_file)
-        thread = threading.Thread(target=processor.process)
-        thread.start()
+        jobs.enqueue(uploaded_file)
         
         return Response(UploadedFileSerializer(uploaded_file).data, status=status.HTTP_201_CREATED)
     
@@ -28,6 +28,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'journal_app.middleware.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'journal_project.urls'
@@ -52,6 +53,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests. Each new connection gets the
+        # PRAGMAs in journal_app.db (WAL, busy timeout, cache); override them
+        # with JOURNAL_SQLITE_PRAGMAS / JOURNAL_SQLITE_BULK_PRAGMAS.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -66,6 +72,60 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024   # 10MB
+FILE_UPLOAD_HANDLERS = [
+    'journal_app.uploadhandlers.HashingUploadHandler',  # SHA-256 for duplicate detection
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Import pipeline settings
+JOURNAL_IMPORT_BATCH_SIZE = 1000  # JournalEntry rows per bulk_create/transaction
+JOURNAL_IMPORT_CHUNK_SIZE = 10000  # CSV rows parsed per pandas chunk
+JOURNAL_IMPORT_SKIP_DUPLICATE_ROWS = False  # drop rows already imported into the project
+JOURNAL_LOG_SAMPLES_PER_CLASS = 5  # verbatim warnings kept per error class
+JOURNAL_LOG_MAX_ROWS_PER_FILE = 500  # ProcessingLog rows per file (errors exempt)
+JOURNAL_PDF_WORKERS = None  # PDF extraction processes; None = one per CPU
+JOURNAL_PDF_PAGES_PER_TASK = 8
+JOURNAL_PDF_MIN_POOL_PAGES = 64  # smaller PDFs are extracted in the importing process
+JOURNAL_LINE_FORMAT_SAMPLE_LINES = 50  # TXT/PDF lines used to detect the line format
+
+# Import queue (see journal_app.jobs). Set JOURNAL_QUEUE_IN_PROCESS_WORKERS = 0
+# when uploads are drained by `manage.py run_import_workers` instead.
+JOURNAL_QUEUE_IN_PROCESS_WORKERS = 2
+JOURNAL_QUEUE_WORKERS = 2  # default pool size for run_import_workers
+JOURNAL_QUEUE_MAX_PENDING = 100  # uploads are rejected beyond this backlog
+JOURNAL_QUEUE_POLL_INTERVAL = 5  # seconds
+JOURNAL_QUEUE_STALE_AFTER = 3600  # seconds without a committed batch before a 'processing' file is requeued
+JOURNAL_EVENTS_HEARTBEAT = 15  # seconds between status re-reads and keep-alives on /file-events/ streams (and WSGI reconnects)
+JOURNAL_EXPORT_CHUNK_SIZE = 2000  # rows fetched per database round-trip
+JOURNAL_UPLOAD_MAX_SIZE = 10 * 1024 * 1024  # PDF/Excel, parsed in memory
+JOURNAL_STREAMING_UPLOAD_MAX_SIZE = 500 * 1024 * 1024  # CSV/TXT, streamed
+
+# Request metrics (journal_app.middleware), scraped from /metrics/.
+# JOURNAL_REQUEST_METRICS = False removes the middleware at startup.
+JOURNAL_REQUEST_METRICS = True
+JOURNAL_SLOW_REQUEST_MS = 500  # log requests slower than this with their SQL
+JOURNAL_SLOW_REQUEST_QUERIES = 50  # ... or issuing more queries than this
+JOURNAL_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Read-through cache for project summaries and first pages of entry listings
+# (journal_app.caching). LocMemCache evicts least recently used keys beyond
+# MAX_ENTRIES but is per process: with several web workers or
+# run_import_workers, point JOURNAL_CACHE_ALIAS at a shared backend, e.g.
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'journal',
+        'TIMEOUT': 300,  # seconds; bounds staleness if an invalidation is missed
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 4,  # evict the least recently used quarter when full
+        },
+    },
+}
+JOURNAL_CACHE_ALIAS = 'default'
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = [